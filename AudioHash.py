@@ -0,0 +1,208 @@
+import collections
+import hashlib
+import os
+import struct
+import sys
+
+import Instrumentation
+import Parallel
+
+_ogg_header_packets = (
+    (b'\x01vorbis', 3),
+    (b'OpusHead', 2),
+    (b'Speex   ', 2),
+)
+
+_empty_hash = hashlib.sha1().hexdigest()
+
+
+def payload_hash(filename, chunk_size=1048576):
+    digest = hashlib.sha1()
+
+    with open(filename, 'rb') as file:
+        if os.path.splitext(filename)[1][1:].lower() in ('ogg', 'oga', 'ogx', 'opus', 'spx'):
+            ranges = _ogg_ranges(file)
+        else:
+            ranges = [_payload_range(file)]
+
+        for start, end in ranges:
+            file.seek(start)
+            remaining = end - start
+
+            while remaining > 0:
+                chunk = file.read(min(chunk_size, remaining))
+
+                if len(chunk) == 0:
+                    break
+
+                digest.update(chunk)
+                remaining -= len(chunk)
+
+    return digest.hexdigest()
+
+
+def _payload_range(file):
+    size = os.fstat(file.fileno()).st_size
+    start = 0
+    end = size
+
+    header = file.read(10)
+
+    if len(header) == 10 and header[:3] == b'ID3':
+        start = 10 + _syncsafe(header[6:10]) + (10 if header[5] & 0x10 else 0)
+        file.seek(start)
+        header = file.read(4)
+
+    if header[:4] == b'fLaC':
+        start += 4
+
+        while start + 4 <= size:
+            file.seek(start)
+            block = file.read(4)
+            start += 4 + struct.unpack('>I', b'\x00' + block[1:4])[0]
+
+            if block[0] & 0x80:
+                break
+
+    if end - start >= 128:
+        file.seek(end - 128)
+        if file.read(3) == b'TAG':
+            end -= 128
+
+    if end - start >= 32:
+        file.seek(end - 32)
+        footer = file.read(32)
+
+        if footer[:8] == b'APETAGEX':
+            tag_size, _, flags = struct.unpack('<III', footer[12:24])
+            end -= tag_size + (32 if flags & 0x80000000 else 0)
+
+    return start, max(start, end)
+
+
+def _ogg_ranges(file):
+    ranges = []
+    headers_left = None
+    offset = 0
+
+    while True:
+        file.seek(offset)
+        header = file.read(27)
+
+        if len(header) < 27 or header[:4] != b'OggS':
+            break
+
+        segments = file.read(header[26])
+        body_start = offset + 27 + len(segments)
+        body_size = sum(segments)
+
+        if headers_left is None:
+            file.seek(body_start)
+            magic = file.read(8)
+            headers_left = next((count for prefix, count in _ogg_header_packets if magic.startswith(prefix)), 0)
+
+        if headers_left > 0:
+            headers_left -= sum(1 for lacing in segments if lacing < 255)
+        else:
+            ranges.append((body_start, body_start + body_size))
+
+        offset = body_start + body_size
+
+    if len(ranges) == 0 and headers_left is None:
+        ranges.append((0, os.fstat(file.fileno()).st_size))
+
+    return ranges
+
+
+def _syncsafe(data):
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+class Deduplicator:
+    modes = ('skip', 'link')
+
+    def __init__(self, mode='skip', workers=8, cache=None, errfile=sys.stderr):
+        if mode not in self.modes:
+            raise Exception('"{}" is not a recognized duplicate mode, expected one of {}'.format(mode, self.modes))
+
+        self.mode = mode
+        self.workers = workers
+        self.cache = cache
+        self.errfile = errfile
+
+        self.hashed = 0
+        self.duplicates = 0
+        self.empty = 0
+        self.failures = 0
+
+    def apply(self, id3_tree):
+        groups = collections.OrderedDict()
+
+        for item, audio_hash in self.hash_iter(list(id3_tree.leaf_iter())):
+            if audio_hash == _empty_hash:
+                self.empty += 1
+                continue
+
+            groups.setdefault((os.path.splitext(item.value.src)[1].lower(), audio_hash), []).append(item)
+
+        for items in groups.values():
+            primary = items[0]
+
+            for item in items[1:]:
+                self.duplicates += 1
+                self.error('Duplicate audio: "{}" is identical to "{}"'.format(item.value.src, primary.value.src))
+
+                if self.mode == 'skip' or item.value.dst == primary.value.dst:
+                    id3_tree.remove_leaf(item)
+                else:
+                    item.value.link = primary.value.dst
+
+    def hash_iter(self, items):
+        stats = Instrumentation.stats
+        cached = set()
+
+        def known(item):
+            audio_hash = self.cache.get_hash(item.value.src) if self.cache is not None else None
+
+            if audio_hash is not None:
+                cached.add(item.value.src)
+
+            return audio_hash
+
+        def hash_item(item):
+            try:
+                return payload_hash(item.value.src)
+            except OSError as error:
+                return error
+
+        def hash_batch(batch):
+            return [hash_item(item) for item in batch]
+
+        with stats.stage('hash'), Parallel.thread_pool(self.workers) as pool:
+            results = Parallel.ordered_batch_map(hash_batch, items, pool, 4, self.workers * 2, known)
+
+            for item, audio_hash in results:
+                if isinstance(audio_hash, OSError):
+                    self.failures += 1
+                    self.error('Failed to hash "{}", leaving it out of deduplication: {}'.format(
+                        item.value.src, audio_hash
+                    ))
+                    continue
+
+                self.hashed += 1
+
+                if self.cache is not None and item.value.src not in cached:
+                    self.cache.put_hash(item.value.src, audio_hash)
+
+                yield item, audio_hash
+
+        stats.count('files hashed', self.hashed)
+        stats.count('hash failures', self.failures)
+
+    def summary(self):
+        return 'Deduplication: {} files hashed, {} duplicates {}, {} without audio left alone, {} failures'.format(
+            self.hashed, self.duplicates, 'skipped' if self.mode == 'skip' else 'linked', self.empty, self.failures
+        )
+
+    def error(self, message):
+        Instrumentation.write_line(self.errfile, message)
@@ -3,25 +3,92 @@ import re
 import stat
 import sys
 import time
+import zlib
+
+import FileScanner
+import Instrumentation
 
 
 class BashWriter:
-    def __init__(self, root, dest, command, keep_formats, outfile=sys.stdout, errfile=sys.stderr):
+    def __init__(self, root, dest, command, keep_formats, outfile=sys.stdout, errfile=sys.stderr, shards=1,
+                 shard=False, extras=None):
         self.root = root
         self.dest = dest
         self.command = command
         self.keep_formats = keep_formats
         self.outfile = outfile
         self.errfile = errfile
+        self.shard = shard
+        self.extras = extras
+        self.shards = []
+
+        self._created = []
+        self._current = None
+        self._written = set()
+        self._targets = {}
+        self._links = []
+
+        if shards > 1:
+            if not hasattr(outfile, 'name') or not os.path.isfile(outfile.name):
+                raise Exception('Sharded scripts need an output file, not {}'.format(getattr(outfile, 'name', outfile)))
+
+            self.shards = [
+                BashWriter(root, dest, command, keep_formats, open('{}.{}'.format(outfile.name, index), 'wb'), errfile,
+                           shard=True, extras=extras)
+                for index in range(shards)
+            ]
+
+    def write_changes(self, id3_tree, orphans=()):
+        self.write_stream(track_iter(id3_tree), orphans,
+                          sum(1 for _ in id3_tree.leaf_iter()) if Instrumentation.stats.show_progress else None)
+
+    def write_stream(self, tracks, orphans=(), total=None):
+        if len(self.shards) > 0:
+            self._write_launcher(tracks, total)
+        else:
+            self._write_header()
+            self._write_tracks(tracks, total)
+
+        self._write_orphans(orphans)
+        self._make_executable()
 
-    def write_changes(self, id3_tree):
-        self._write_header()
-        self._write_body(id3_tree)
+    def write_manifest(self, tracks):
+        for directory, src, dst, link in tracks:
+            FileScanner.add_extras_target(self._targets, os.path.dirname(src), directory)
+            self.output(src + '\0' + dst, '\0')
+            Instrumentation.stats.count('operations written')
 
+        for src_directory, directory in self._targets.items():
+            for extra in FileScanner.keep_files(src_directory, self.keep_formats, self.extras):
+                self.output(extra + '\0' + os.path.join(directory, os.path.basename(extra)), '\0')
+                Instrumentation.stats.count('extra files written')
+
+    def _write_launcher(self, tracks, total):
+        self._write_preamble()
+
+        for shard in self.shards:
+            shard._write_header()
+
+        self._write_tracks(tracks, total)
+
+        self.output('# Each shard creates its own directories, so the shards can run concurrently.')
+        for shard in self.shards:
+            shard._make_executable()
+            shard.outfile.close()
+            self.output('"$(dirname "$0")/{}" &'.format(os.path.basename(shard.outfile.name)))
+        self.output('wait')
+
+    def _make_executable(self):
         if os.path.isfile(self.outfile.name):
             os.chmod(self.outfile.name, os.stat(self.outfile.name).st_mode | stat.S_IEXEC)
 
     def _write_header(self):
+        self._write_preamble()
+        self._write_keep_files()
+        self.output('')
+        self._write_fcn(self.command)
+
+    def _write_preamble(self):
         self.output('#!/usr/bin/env bash')
         self.output('')
         self.output('SOURCE="{}"'.format(self.root))
@@ -48,18 +115,15 @@ class BashWriter:
             '        exit\n' \
             '        ;;\n' \
             'esac\n'
-        self.output(permission_check)
-        self._write_keep_files()
-        self.output('')
-        self._write_fcn(self.command)
+
+        if not self.shard:
+            self.output(permission_check)
 
     def _write_keep_files(self):
-        self.output('# keep_files moves any extraneous files from the source directory to the destination directory.')
-        self.output('# it\'s currently defined to move ' + str(self.keep_formats))
+        self.output('# keep_files copies the extraneous files listed after the destination directory into it.')
+        self.output('# They were collected at plan time for the formats ' + str(self.keep_formats))
         self.output('keep_files() {')
-        for file_format in self.keep_formats:
-            wildcard = '"${{1}}"/*.{}'.format(file_format)
-            self.output('    if ls {} 1> /dev/null 2>&1; then cp {} "${{2}}"; fi'.format(wildcard, wildcard))
+        self.output('    cp "${@:2}" "${1}"')
         self.output('}')
 
     def _write_fcn(self, function):
@@ -69,21 +133,101 @@ class BashWriter:
         self.output('    {}'.format(function))
         self.output('}')
 
-    def _write_body(self, id3_tree):
-        created = []
+    def _write_tracks(self, tracks, total=None):
+        stats = Instrumentation.stats
+
+        for done, (directory, src, dst, link) in enumerate(tracks, 1):
+            FileScanner.add_extras_target(self._targets, os.path.dirname(src), directory)
+            writer = self._shard_for(os.path.dirname(link) if link is not None else directory)
+            writer.write_track(directory, src, dst, link)
+            stats.progress('Writing script', done, total)
+
+        self._write_extras()
+
+        for writer in self.shards if len(self.shards) > 0 else (self,):
+            writer._write_links()
+
+        stats.end_progress()
+
+    def _shard_for(self, directory):
+        if len(self.shards) == 0:
+            return self
 
-        for item in id3_tree.leaf_iter():
-            directory = item.parent.get_tree_path()
+        return self.shards[zlib.crc32(directory.encode('utf-8', 'surrogateescape')) % len(self.shards)]
 
-            if directory not in created:
-                self.make_directories(created, directory)
-                img_src = self.prepare_path('/'.join(item.value['src'].split('/')[:-1]))
-                self.output('keep_files "{}" "{}"'.format(img_src, self.prepare_path(directory)))
+    def write_track(self, directory, src, dst, link=None):
+        if directory != self._current:
+            self._current = directory
+            self._written = set()
+            absolute = '/' + '/'.join(part for part in directory.split('/') if len(part) > 0)
+            self._created = [path for path in self._created if absolute == path or absolute.startswith(path + '/')]
 
-            src = self.prepare_path(item.value['src'])
-            dst = self.prepare_path(item.value['dst'])
+            if directory not in self._created:
+                self.make_directories(self._created, directory)
 
-            self.output('fcn "{}" "{}"'.format(src, dst))
+        if (src, dst) in self._written:
+            return
+
+        self._written.add((src, dst))
+
+        if link is not None:
+            self._links.append((link, dst))
+        else:
+            self.output('fcn "{}" "{}"'.format(self.prepare_path(src), self.prepare_path(dst)))
+        Instrumentation.stats.count('operations written')
+
+    def _write_links(self):
+        if len(self._links) == 0:
+            return
+
+        self.output('')
+        self.output('# Duplicates are linked once every primary has been organized.')
+
+        for link, dst in self._links:
+            self.output('ln -f "{}" "{}"'.format(self.prepare_path(link), self.prepare_path(dst)))
+
+        self._links = []
+
+    def _write_extras(self):
+        started = set()
+
+        for src_directory, directory in self._targets.items():
+            extras = FileScanner.keep_files(src_directory, self.keep_formats, self.extras)
+
+            if len(extras) == 0:
+                continue
+
+            writer = self._shard_for(directory)
+
+            if writer not in started:
+                started.add(writer)
+                writer.output('')
+                writer.output('# Extra files go to the deepest directory shared by the tracks they came with.')
+
+            if writer.shard:
+                writer.output('mkdir -p "{}"'.format(writer.prepare_path(directory)))
+
+            writer.output('keep_files "{}" {}'.format(
+                writer.prepare_path(directory), ' '.join('"{}"'.format(writer.prepare_path(extra)) for extra in extras)
+            ))
+            Instrumentation.stats.count('extra files written', len(extras))
+
+        self._targets = {}
+
+    def _write_orphans(self, orphans):
+        if len(orphans) == 0:
+            return
+
+        self.output('')
+        self.output('# orphan is called for files in the destination that this plan no longer produces.')
+        self.output('# It only reports them by default; change it to rm "$1" to delete them.')
+        self.output('orphan() {')
+        self.output('    echo "Orphaned file: $1"')
+        self.output('}')
+        self.output('')
+
+        for orphan in orphans:
+            self.output('orphan "{}"'.format(self.prepare_path(orphan)))
 
     def output(self, data, postfix='\n'):
         try:
@@ -126,6 +270,12 @@ class BashWriter:
             cleaned = self.prepare_path(path)
 
             self.output('\n# Creating directory for "{}"'.format(cleaned))
-            self.output('mkdir "{}"'.format(cleaned))
+            self.output('mkdir {}"{}"'.format('-p ' if self.shard else '', cleaned))
+            Instrumentation.stats.count('directories created')
 
         self.output('echo "Migrating to {}"'.format(self.prepare_path(full_path).replace('${DESTINATION}/', '')))
+
+
+def track_iter(id3_tree):
+    for item in id3_tree.leaf_iter():
+        yield item.parent.get_tree_path(), item.value.src, item.value.dst, item.value.link
@@ -0,0 +1,182 @@
+import concurrent.futures
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import FileScanner
+import Instrumentation
+import Parallel
+from NativeExecutor import copy_file
+
+
+class CommandScheduler:
+    def __init__(self, root, dest, command, keep_formats, workers=1, timeout=None, retries=0, errfile=sys.stderr,
+                 extras=None):
+        self.root = root
+        self.dest = dest
+        self.command = command
+        self.keep_formats = keep_formats
+        self.workers = workers
+        self.timeout = timeout
+        self.retries = retries
+        self.errfile = errfile
+        self.extras = extras
+        self.script = 'fcn() {{\n    {}\n}}\nfcn "$@"'.format(command)
+
+        self.files = 0
+        self.bytes = 0
+        self.failures = 0
+        self.retried = 0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def write_changes(self, id3_tree, orphans=()):
+        start = time.time()
+        stats = Instrumentation.stats
+        jobs, links = self.prepare(id3_tree)
+        done = 0
+
+        with Parallel.thread_pool(self.workers) as pool:
+            futures = [pool.submit(self.run_job, src, dst, size) for size, src, dst in jobs]
+
+            for future in concurrent.futures.as_completed(futures):
+                future.result()
+                done += 1
+                stats.progress('Running commands', done, len(jobs))
+
+        for primary, dst in links:
+            try:
+                if os.path.lexists(dst):
+                    os.unlink(dst)
+                os.link(primary, dst)
+                self.files += 1
+            except OSError as error:
+                self.failures += 1
+                self.error('Failed to link "{}" to "{}": {}'.format(dst, primary, error))
+
+        stats.end_progress()
+        stats.count('commands run', self.files)
+        stats.count('command retries', self.retried)
+        stats.count('command timeouts', self.timeouts)
+        stats.count('failures', self.failures)
+
+        for orphan in orphans:
+            self.error('Orphaned file: "{}"'.format(orphan))
+
+        self.error(self.summary(time.time() - start))
+
+    def prepare(self, id3_tree):
+        jobs = []
+        links = []
+        created = set()
+        failed = set()
+        targets = {}
+
+        for item in id3_tree.leaf_iter():
+            directory = item.parent.get_tree_path()
+
+            if directory in failed:
+                continue
+
+            if directory not in created:
+                try:
+                    os.makedirs(directory, exist_ok=True)
+                except OSError as error:
+                    failed.add(directory)
+                    self.failures += 1
+                    self.error('Failed to create directory "{}", skipping its files: {}'.format(directory, error))
+                    continue
+
+                created.add(directory)
+
+            FileScanner.add_extras_target(targets, item.value.src_directory, directory)
+
+            if item.value.link is not None:
+                links.append((item.value.link, item.value.dst))
+                continue
+
+            try:
+                size = os.stat(item.value.src).st_size
+            except OSError:
+                size = 0
+
+            jobs.append((size, item.value.src, item.value.dst))
+
+        for src_directory, directory in targets.items():
+            self.copy_extras(src_directory, directory)
+
+        jobs.sort(key=lambda job: job[0], reverse=True)
+
+        return jobs, links
+
+    def copy_extras(self, src_directory, directory):
+        for src in FileScanner.keep_files(src_directory, self.keep_formats, self.extras):
+            try:
+                copy_file(src, os.path.join(directory, os.path.basename(src)))
+            except OSError as error:
+                self.failures += 1
+                self.error('Failed to copy "{}" to "{}": {}'.format(src, directory, error))
+
+    def run_job(self, src, dst, size):
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                with self._lock:
+                    self.retried += 1
+
+            error = self.run_command(src, dst)
+
+            if error is None:
+                with self._lock:
+                    self.files += 1
+                    self.bytes += size
+                return
+
+            try:
+                if os.path.lexists(dst):
+                    os.unlink(dst)
+            except OSError:
+                pass
+
+        with self._lock:
+            self.failures += 1
+
+        self.error('Failed to run command for "{}" -> "{}" after {} attempts: {}'.format(
+            src, dst, self.retries + 1, error
+        ))
+
+    def run_command(self, src, dst):
+        process = subprocess.Popen(['bash', '-c', self.script, 'fcn', src, dst], stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, start_new_session=True)
+
+        try:
+            _, stderr = process.communicate(timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+            process.communicate()
+
+            with self._lock:
+                self.timeouts += 1
+
+            return 'timed out after {}s'.format(self.timeout)
+
+        if process.returncode != 0:
+            message = stderr.decode('utf-8', 'replace').strip().splitlines()
+            return 'exit status {}{}'.format(process.returncode, ': ' + message[-1] if len(message) > 0 else '')
+
+        return None
+
+    def summary(self, elapsed):
+        return 'Ran the command for {} files ({:.1f} MiB) in {:.2f}s with {} workers, {} retries, {} timeouts, ' \
+               '{} failures'.format(self.files, self.bytes / 1048576, elapsed, self.workers, self.retried,
+                                    self.timeouts, self.failures)
+
+    def error(self, message):
+        with self._lock:
+            Instrumentation.write_line(self.errfile, message)
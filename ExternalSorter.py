@@ -0,0 +1,58 @@
+import heapq
+import json
+import tempfile
+
+import Instrumentation
+
+
+class ExternalSorter:
+    def __init__(self, key, buffer_size=100000, directory=None):
+        self.key = key
+        self.buffer_size = buffer_size
+        self.directory = directory
+
+        self.buffer = []
+        self.runs = []
+        self.count = 0
+
+    def add(self, record):
+        self.buffer.append((self.key(record), self.count, record))
+        self.count += 1
+
+        if len(self.buffer) >= self.buffer_size:
+            self.spill()
+
+    def spill(self):
+        self.buffer.sort()
+        run = tempfile.TemporaryFile('w+', encoding='utf-8', dir=self.directory)
+
+        for entry in self.buffer:
+            run.write(json.dumps(entry) + '\n')
+
+        run.seek(0)
+        self.runs.append(run)
+        self.buffer = []
+        Instrumentation.stats.count('sort runs spilled')
+
+    def __iter__(self):
+        self.buffer.sort()
+        streams = [iter(self.buffer)] + [(_load(line) for line in run) for run in self.runs]
+
+        try:
+            for entry in heapq.merge(*streams):
+                yield entry[2]
+        finally:
+            self.close()
+
+    def close(self):
+        for run in self.runs:
+            run.close()
+
+        self.runs = []
+        self.buffer = []
+
+
+def _load(line):
+    key, count, record = json.loads(line)
+
+    return key, count, tuple(record)
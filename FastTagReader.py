@@ -0,0 +1,257 @@
+import collections
+import mmap
+import re
+import struct
+
+_id3_text_frames = {
+    'TALB': 'album',
+    'TIT2': 'title',
+    'TPE1': 'artist',
+    'TPE2': 'albumartist',
+    'TPOS': 'discnumber',
+    'TPUB': 'organization',
+    'TRCK': 'tracknumber',
+    'TMED': 'media',
+    'TCON': 'genre',
+    'TDRC': 'date',
+    'TDOR': 'originaldate',
+}
+
+_id3_txxt_frames = {
+    'CATALOGNUMBER': 'catalognumber',
+    'PERFORMER': 'performer',
+}
+
+_id3_unsupported_frames = ('TDAT', 'TIME', 'TORY')
+
+_id3_encodings = (
+    ('latin-1', b'\x00'),
+    ('utf-16', b'\x00\x00'),
+    ('utf-16-be', b'\x00\x00'),
+    ('utf-8', b'\x00'),
+)
+
+_timestamp_split = re.compile('[-T:/.]|\\s+')
+_timestamp_formats = ('%04d',) + ('%02d',) * 5
+_timestamp_separators = ('-', '-', ' ', ':', ':', 'x')
+
+_flac_streaminfo = 0
+_flac_vorbis_comment = 4
+
+
+class Unsupported(Exception):
+    pass
+
+
+def read(filename):
+    try:
+        with open(filename, 'rb') as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if _has_id3v1(data):
+                    return None
+
+                if data[:3] == b'ID3':
+                    return _read_id3(data)
+
+                if data[:4] == b'fLaC':
+                    return _read_flac(data)
+    except (Unsupported, ValueError, IndexError, OSError, struct.error):
+        pass
+
+    return None
+
+
+def _has_id3v1(data):
+    return data.find(b'TAG', max(0, len(data) - 133)) != -1
+
+
+def _read_id3(data):
+    major, revision, flags = data[3], data[4], data[5]
+
+    if major not in (3, 4) or flags & 0xc0 or flags & (0x0f if major == 4 else 0x1f):
+        raise Unsupported()
+
+    end = 10 + _syncsafe(data[6:10])
+    offset = 10
+    frames = {}
+
+    while offset + 10 <= end:
+        frame_id = data[offset:offset + 4]
+
+        if frame_id == b'\x00\x00\x00\x00':
+            break
+
+        if not re.fullmatch(b'[A-Z0-9]{4}', frame_id):
+            raise Unsupported()
+
+        if major == 4:
+            size = _syncsafe(data[offset + 4:offset + 8])
+        else:
+            size = struct.unpack('>I', data[offset + 4:offset + 8])[0]
+        frame_flags = struct.unpack('>H', data[offset + 8:offset + 10])[0]
+        start = offset + 10
+        offset = start + size
+
+        if offset > end:
+            raise Unsupported()
+
+        frame_id = frame_id.decode('ascii')
+
+        if frame_id in _id3_unsupported_frames:
+            raise Unsupported()
+
+        if frame_id not in _id3_text_frames and frame_id not in ('TXXX', 'TYER'):
+            continue
+
+        if frame_flags & (0x004f if major == 4 else 0x00e0):
+            raise Unsupported()
+
+        values = _decode_text(data[start:offset])
+
+        if frame_id == 'TXXX':
+            if len(values) < 1 or values[0] not in _id3_txxt_frames:
+                continue
+            frame_id, values = 'TXXX:' + values[0], values[1:]
+
+        if frame_id in frames:
+            raise Unsupported()
+
+        frames[frame_id] = values
+
+    if major == 3 and 'TYER' in frames:
+        years = [year for year in frames.pop('TYER') if re.match('([0-9]{4})(-[0-9]{2}-[0-9]{2})?\\Z', year)]
+        if len(years) > 0 and 'TDRC' not in frames:
+            frames['TDRC'] = years
+
+    tags = {}
+
+    for frame_id, values in frames.items():
+        if frame_id.startswith('TXXX:'):
+            tags[_id3_txxt_frames[frame_id[5:]]] = values
+        elif frame_id == 'TCON':
+            tags['genre'] = _genres(values)
+        elif frame_id in ('TDRC', 'TDOR'):
+            tags[_id3_text_frames[frame_id]] = [_timestamp(value) for value in values]
+        else:
+            tags[_id3_text_frames[frame_id]] = values
+
+    return tags
+
+
+def _decode_text(frame):
+    if len(frame) < 1 or frame[0] > 3:
+        raise Unsupported()
+
+    encoding, terminator = _id3_encodings[frame[0]]
+    data = frame[1:]
+    values = []
+
+    while len(data) > 0:
+        index = data.find(terminator)
+
+        while len(terminator) == 2 and index != -1 and index % 2 != 0:
+            index = data.find(terminator, index + 1)
+
+        if index == -1:
+            index = len(data)
+
+        if frame[0] == 1 and index > 0 and data[:2] not in (b'\xff\xfe', b'\xfe\xff'):
+            raise Unsupported()
+
+        values.append(data[:index].decode(encoding))
+        data = data[index + len(terminator):]
+
+    return values
+
+
+def _genres(values):
+    genres = []
+
+    for value in values:
+        if value.isdecimal() or value in ('CR', 'RX') or value.startswith('('):
+            raise Unsupported()
+
+        if value:
+            genres.append(value)
+
+    return genres
+
+
+def _timestamp(text):
+    parts = []
+
+    for part in _timestamp_split.split(text + ':::::')[:6]:
+        try:
+            parts.append(int(part))
+        except ValueError:
+            break
+
+    return ''.join(
+        _timestamp_formats[i] % part + _timestamp_separators[i] for i, part in enumerate(parts)
+    )[:-1]
+
+
+def _read_flac(data):
+    offset = 4
+    tags = None
+    first = True
+
+    while True:
+        header = data[offset]
+        size = struct.unpack('>I', b'\x00' + data[offset + 1:offset + 4])[0]
+        block_type = header & 0x7f
+        start = offset + 4
+        offset = start + size
+
+        if offset > len(data) or first and not _valid_streaminfo(block_type, data[start:offset]):
+            raise Unsupported()
+        first = False
+
+        if block_type == _flac_vorbis_comment:
+            if tags is not None:
+                raise Unsupported()
+            tags = _read_vorbis_comment(data[start:offset])
+
+        if header & 0x80:
+            break
+
+    return tags if tags is not None else {}
+
+
+def _valid_streaminfo(block_type, block):
+    if block_type != _flac_streaminfo or len(block) < 34:
+        return False
+
+    return (block[10] << 12 | block[11] << 4 | block[12] >> 4) != 0
+
+
+def _read_vorbis_comment(block):
+    vendor_length = struct.unpack('<I', block[:4])[0]
+    offset = 4 + vendor_length
+    count = struct.unpack('<I', block[offset:offset + 4])[0]
+    offset += 4
+    tags = collections.OrderedDict()
+
+    for _ in range(count):
+        length = struct.unpack('<I', block[offset:offset + 4])[0]
+        comment = block[offset + 4:offset + 4 + length].decode('utf-8')
+        offset += 4 + length
+
+        if '=' not in comment:
+            raise Unsupported()
+
+        key, value = comment.split('=', 1)
+
+        if len(key) == 0 or not all(' ' <= symbol <= '}' for symbol in key):
+            raise Unsupported()
+
+        tags.setdefault(key.lower(), []).append(value)
+
+    return dict(tags)
+
+
+def _syncsafe(data):
+    if any(byte & 0x80 for byte in data):
+        raise Unsupported()
+
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
@@ -0,0 +1,126 @@
+import os
+import time
+
+import Instrumentation
+
+
+class FileScanner:
+    def __init__(self, root, extensions, ignore_hidden=True, extra_extensions=(), snapshot=None):
+        if not os.path.exists(root):
+            raise Exception('"{}" does not exist'.format(root))
+
+        self.root = os.path.realpath(root)
+        self.extensions = extensions
+        self.ignore_hidden = ignore_hidden
+        self.extra_extensions = extra_extensions
+        self.extras = {}
+        self.snapshot = snapshot
+
+    def __iter__(self):
+        if not os.path.isdir(self.root):
+            if self.is_wanted(self.root):
+                yield self.root
+            return
+
+        stack = [iter((self.root,))]
+
+        while len(stack) > 0:
+            directory = next(stack[-1], None)
+
+            if directory is None:
+                stack.pop()
+                continue
+
+            files, directories = self.scan_directory(directory)
+            Instrumentation.stats.count('directories scanned')
+            Instrumentation.stats.count('files scanned', len(files))
+
+            for path in files:
+                yield path
+
+            stack.append(iter(directories))
+
+        if self.snapshot is not None:
+            self.snapshot.prune_unseen()
+
+    def scan_directory(self, directory):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+
+        try:
+            return self._scan_directory(directory)
+        finally:
+            Instrumentation.stats.add_time('scan', time.perf_counter() - wall, time.process_time() - cpu)
+
+    def _scan_directory(self, directory):
+        if self.snapshot is not None:
+            mtime = os.stat(directory).st_mtime_ns
+            entry = self.snapshot.get(directory, mtime)
+
+            if entry is not None:
+                files, directories, extras = entry
+                self._set_extras(directory, extras)
+                Instrumentation.stats.count('directories reused')
+
+                return files, directories
+
+        files = []
+        directories = []
+        extras = []
+
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if self.ignore_hidden and entry.name.startswith('.'):
+                    continue
+
+                path = os.path.realpath(entry.path) if entry.is_symlink() else entry.path
+
+                if entry.is_dir():
+                    directories.append(path)
+                elif entry.is_file():
+                    if self.is_wanted(path):
+                        files.append(path)
+                    elif os.path.splitext(entry.name)[1][1:] in self.extra_extensions:
+                        extras.append(path)
+
+        extras.sort()
+        self._set_extras(directory, extras)
+
+        if self.snapshot is not None:
+            self.snapshot.put(directory, mtime, files, directories, extras)
+
+        return files, directories
+
+    def _set_extras(self, directory, extras):
+        if len(extras) > 0:
+            self.extras[directory] = extras
+        else:
+            self.extras.pop(directory, None)
+
+    def is_wanted(self, path):
+        return os.path.splitext(path)[-1][1:] in self.extensions
+
+
+def keep_files(directory, keep_formats, extras=None):
+    if extras is not None:
+        return extras.get(directory, [])
+
+    return extra_files(directory, keep_formats)
+
+
+def add_extras_target(targets, src_directory, directory):
+    target = targets.get(src_directory)
+    targets[src_directory] = directory if target is None else os.path.commonpath((target, directory))
+
+
+def extra_files(directory, extensions, ignore_hidden=True):
+    try:
+        names = sorted(os.listdir(directory))
+    except OSError:
+        return []
+
+    return [
+        os.path.join(directory, name) for name in names
+        if not (ignore_hidden and name.startswith('.')) and os.path.splitext(name)[1][1:] in extensions and
+        os.path.isfile(os.path.join(directory, name))
+    ]
@@ -1,16 +1,27 @@
 import os
 import re
 import sys
+import time
 
 from mutagen import File as VorbisID3
 from mutagen.easyid3 import EasyID3
 from mutagen.id3 import ID3NoHeaderError
 
+import FastTagReader
+import Instrumentation
+import Locality
+import Parallel
+
 album_tags = (
     'year', 'date', 'originalyear', 'originaldate', 'label', 'catalogno', 'upc', 'media', 'albumartist', 'disctotal',
     'tracktotal'
 )
 
+release_tags = (
+    'year', 'date', 'originalyear', 'originaldate', 'label', 'catalogno', 'upc', 'media', 'albumartist', 'album',
+    'disctotal'
+)
+
 album_tag_data = {}
 
 audio_extensions = (
@@ -85,36 +96,69 @@ _tag_alias = (
 )
 
 
+class Tags(dict):
+    def __missing__(self, key):
+        lower = key.lower()
+
+        if lower == key or not dict.__contains__(self, lower):
+            raise KeyError(key)
+
+        value = dict.__getitem__(self, lower)
+
+        return value.upper() if value is not None else None
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or key != key.lower() and dict.__contains__(self, key.lower())
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+
+def album_key(tags):
+    return (tags.get('albumartist'), tags['album']) if tags.get('album') is not None else None
+
+
 def request_tag_value(tags, tag, filename):
+    album = album_key(tags)
+
     if tag in album_tags:
-        if tags['album'] is not None and tags['album'] in album_tag_data and tag in album_tag_data[tags['album']]:
-            return album_tag_data[tags['album']][tag]
+        if album is not None and album in album_tag_data and tag in album_tag_data[album]:
+            return album_tag_data[album][tag]
 
-    sys.stdout.write('Enter value for tag "{}" in file "{}": '.format(tag, filename))
-    sys.stdout.flush()
-    value = sys.stdin.readline().replace('\n', '')
+    Instrumentation.stats.count('prompts')
+    value = prompt_value('Enter value for tag "{}" in file "{}": '.format(tag, filename))
 
-    if tag in album_tags and tags['album'] is not None:
-        if tags['album'] not in album_tag_data:
-            album_tag_data[tags['album']] = {}
-        album_tag_data[tags['album']][tag] = value
+    if tag in album_tags and album is not None:
+        if album not in album_tag_data:
+            album_tag_data[album] = {}
+        album_tag_data[album][tag] = value
 
     return value
 
 
-def pad_tag(tags, totaltag, paddedtag, filename):
+def prompt_value(message):
+    sys.stdout.write(message)
+    sys.stdout.flush()
+
+    return sys.stdin.readline().replace('\n', '')
+
+
+def pad_tag(tags, totaltag, paddedtag, filename, request=None):
     if tags[totaltag] is None:
-        tags[totaltag] = request_tag_value(tags, totaltag, filename)
+        tags[totaltag] = (request or request_tag_value)(tags, totaltag, filename)
 
-    if len(tags[totaltag]) > 1:
+    if tags[totaltag] is not None and len(tags[totaltag]) > 1:
         tags[paddedtag] = tags[paddedtag].zfill(len(tags[totaltag]))
 
 
-def get_tags(filename):
-    try:
-        id3 = dict(EasyID3(filename))
-    except ID3NoHeaderError:
-        id3 = VorbisID3(filename)
+def read_tags(filename):
+    id3 = FastTagReader.read(filename)
+
+    if id3 is None:
+        try:
+            id3 = dict(EasyID3(filename))
+        except ID3NoHeaderError:
+            id3 = VorbisID3(filename)
 
     tags = {}
 
@@ -130,12 +174,146 @@ def get_tags(filename):
         if alias[0] not in tags:
             tags[alias[0]] = None
 
+    tags['format'] = os.path.splitext(filename)[1][1:].lower()
+
+    return tags
+
+
+def unify_release(tracks):
+    conflicts = []
+
+    for tag in release_tags:
+        values = [tags.get(tag) for _, tags in tracks]
+        counts = {}
+
+        for value in values:
+            if value is not None:
+                counts[value] = counts.get(value, 0) + 1
+
+        if len(counts) == 0 or len(counts) == 1 and None not in values:
+            continue
+
+        chosen = max(counts, key=lambda value: (counts[value], -values.index(value)))
+
+        for filename, tags in tracks:
+            if tags.get(tag) != chosen:
+                conflicts.append((filename, tag, tags.get(tag), chosen))
+                tags[tag] = chosen
+
+    return conflicts
+
+
+def complete_tags(tags, filename, request=None):
+    if not isinstance(tags, Tags):
+        tags = Tags(tags)
+
     if tags['tracknumber'] is not None:
-        pad_tag(tags, 'tracktotal', 'tracknumber', filename)
+        pad_tag(tags, 'tracktotal', 'tracknumber', filename, request)
     if tags['discnumber'] is not None:
-        pad_tag(tags, 'disctotal', 'discnumber', filename)
-
-    tags['format'] = os.path.splitext(filename)[1][1:].lower()
-    tags.update({key.upper(): value.upper() if value is not None else None for key, value in tags.items()})
+        pad_tag(tags, 'disctotal', 'discnumber', filename, request)
 
     return tags
+
+
+def read_tags_timed(filename):
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    tags = read_tags(filename)
+
+    return tags, time.perf_counter() - wall, time.process_time() - cpu
+
+
+def read_tags_batch(filenames):
+    return [read_tags_timed(filename) for filename in filenames]
+
+
+def prefetch_header(filename, size=65536):
+    try:
+        with open(filename, 'rb') as file:
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(file.fileno(), 0, size, os.POSIX_FADV_WILLNEED)
+
+            file.read(size)
+            file.seek(max(0, os.fstat(file.fileno()).st_size - 256))
+            file.read(256)
+    except OSError:
+        pass
+
+    return filename
+
+
+def tag_iter(filenames, jobs=1, cache=None, io_workers=0, readahead=None, locality=0):
+    if locality <= 0:
+        for filename, tags in _tag_iter(filenames, jobs, cache, io_workers, readahead):
+            yield filename, tags
+        return
+
+    stats = Instrumentation.stats
+
+    for chunk in Locality.chunks(filenames, locality):
+        results = {}
+
+        if cache is not None:
+            for filename in chunk:
+                tags = cache.get(filename)
+
+                if tags is not None:
+                    stats.count('tag cache hits')
+                    results[filename] = tags
+
+        missing = sorted({filename for filename in chunk if filename not in results}, key=Locality.physical_key)
+        results.update(_tag_iter(missing, jobs, cache, io_workers, readahead, False))
+
+        for filename in chunk:
+            yield filename, results[filename]
+
+
+def _tag_iter(filenames, jobs=1, cache=None, io_workers=0, readahead=None, lookup=True):
+    known = None
+    pools = []
+    readahead = readahead if readahead is not None else io_workers * 4
+
+    if cache is not None and lookup:
+        def known(filename):
+            tags = cache.get(filename)
+            return (tags, None, None) if tags is not None else None
+
+    if jobs <= 1 and io_workers > 0:
+        pools.append(Parallel.thread_pool(io_workers))
+        results = Parallel.ordered_batch_map(read_tags_batch, filenames, pools[0], 1, max(readahead, 1), known)
+    elif jobs <= 1:
+        results = ((filename, known(filename) if known is not None else None) for filename in filenames)
+        results = ((filename, timed if timed is not None else read_tags_timed(filename)) for filename, timed in results)
+    else:
+        if io_workers > 0:
+            pools.append(Parallel.thread_pool(io_workers))
+            filenames = (
+                filename for filename, _ in
+                Parallel.ordered_map(prefetch_header, filenames, pools[-1], max(readahead, 1))
+            )
+
+        pools.append(Parallel.process_pool(jobs))
+        results = Parallel.ordered_batch_map(read_tags_batch, filenames, pools[-1], window=jobs * 2, known=known)
+
+    stats = Instrumentation.stats
+
+    try:
+        for filename, (tags, wall, cpu) in results:
+            if wall is None:
+                stats.count('tag cache hits')
+            else:
+                stats.count('tags read')
+                stats.add_time('read', wall, cpu)
+                stats.record_file(filename, wall)
+
+                if cache is not None:
+                    cache.put(filename, tags)
+
+            yield filename, tags
+    finally:
+        for pool in pools:
+            pool.shutdown()
+
+
+def get_tags(filename):
+    return complete_tags(read_tags(filename), filename)
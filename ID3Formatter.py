@@ -16,8 +16,67 @@ _replacements = {
 }
 
 
-def format_path(string_format, tags, filename):
-    return format_string(string_format, {key: _clean(value) for key, value in tags.items()}, filename)
+_compiled_formats = {}
+
+_album_level_tags = set(ID3.album_tags + ('album', 'format'))
+_album_level_tags |= {tag.upper() for tag in _album_level_tags}
+
+_tests = (
+    ('!=', lambda tag, value: tag != value),
+    ('<>', lambda tag, value: tag != value),
+    ('==', lambda tag, value: tag == value),
+    ('>', lambda tag, value: tag > value),
+    ('>=', lambda tag, value: tag >= value),
+    ('<', lambda tag, value: tag < value),
+    ('<=', lambda tag, value: tag <= value)
+)
+
+
+class CompiledFormat:
+    def __init__(self, string_format, prefix_cache_size=4096):
+        self.string_format = string_format
+        self.nodes = _compile_nodes(string_format)
+        self.tag_names = _referenced_tags(self.nodes) | {'album'}
+        self.prefix_cache_size = prefix_cache_size
+        self._prefix_cache = {}
+
+        self.prefix_length = 0
+        for node in self.nodes:
+            if not _referenced_tags([node]).issubset(_album_level_tags):
+                break
+            self.prefix_length += 1
+
+        self.prefix_tags = tuple(sorted(_referenced_tags(self.nodes[:self.prefix_length])))
+        self.prefix_required = tuple(sorted(_required_tags(self.nodes[:self.prefix_length])))
+
+    def format(self, tags, filename, request=None):
+        tags = {key: _clean(tags[key]) for key in self.tag_names if key in tags}
+
+        if self.prefix_length == 0 or any(tags.get(key) is None for key in self.prefix_required):
+            return _evaluate(self.nodes, tags, filename, request=request)
+
+        key = tuple(tags[name] for name in self.prefix_tags if name in tags)
+        prefix = self._prefix_cache.get(key)
+
+        if prefix is None:
+            if len(self._prefix_cache) >= self.prefix_cache_size:
+                self._prefix_cache.clear()
+
+            prefix = _evaluate(self.nodes[:self.prefix_length], tags, filename)
+            self._prefix_cache[key] = prefix
+
+        return _evaluate(self.nodes[self.prefix_length:], tags, filename, prefix, request)
+
+
+def compile_format(string_format):
+    if string_format not in _compiled_formats:
+        _compiled_formats[string_format] = CompiledFormat(string_format)
+
+    return _compiled_formats[string_format]
+
+
+def format_path(string_format, tags, filename, request=None):
+    return compile_format(string_format).format(tags, filename, request)
 
 
 def format_string(string_format, tags, filename):
@@ -29,6 +88,9 @@ def format_string(string_format, tags, filename):
                 string += format_string(section[section.find('"') + 1:-1], tags, filename)
         else:
             for part in re.split('(:.*?:)*', section):
+                if part is None:
+                    continue
+
                 if ':' in part:
                     part = part.replace(':', '')
 
@@ -148,6 +210,122 @@ def _test_condition(conditional, tags):
     return False
 
 
+def _compile_nodes(string_format):
+    nodes = []
+
+    for section in _conditional_split(string_format):
+        if section.startswith('?'):
+            if section.count('"') < 2 or not section.endswith('"'):
+                raise Exception('Malformed conditional')
+
+            conditional = section[1:section[1:].find('?') + 1]
+            nodes.append((
+                'condition',
+                tuple(_compile_condition(condition) for condition in conditional.split('|')),
+                _compile_nodes(section[section.find('"') + 1:-1])
+            ))
+        else:
+            for part in re.split('(:.*?:)*', section):
+                if part is None or len(part) == 0:
+                    continue
+
+                if ':' in part:
+                    part = part.replace(':', '')
+                    nodes.append(('tag', part.replace('?', ''), '?' not in part))
+                else:
+                    nodes.append(('text', part))
+
+    return nodes
+
+
+def _compile_condition(condition):
+    steps = []
+    tag = condition
+
+    for test, function in _tests:
+        if test not in tag:
+            continue
+
+        expected_value = tag[tag.rfind(test) + len(test):]
+        tag = tag[:tag.find(test)]
+
+        steps.append((tag, function, expected_value, re.fullmatch('\\d+', expected_value) is not None))
+
+    return condition, tuple(steps)
+
+
+def _test_compiled_condition(conditions, tags):
+    for condition, steps in conditions:
+        met_requirements = False
+
+        if condition in tags and tags[condition] is not None:
+            return True
+
+        for tag, function, expected_value, numeric in steps:
+            if tags[tag] is None or len(tags[tag]) == 0:
+                continue
+
+            if numeric and re.fullmatch('\\d+', tags[tag]):
+                met_requirements = function(int(tags[tag]), int(expected_value))
+            else:
+                met_requirements = function(tags[tag], expected_value)
+
+            break
+
+        if met_requirements:
+            return True
+
+    return False
+
+
+def _evaluate(nodes, tags, filename, string='', request=None):
+    for node in nodes:
+        if node[0] == 'text':
+            string += node[1]
+        elif node[0] == 'tag':
+            if tags[node[1]] is None:
+                if not node[2]:
+                    string = string.rstrip()
+                    continue
+                else:
+                    tags[node[1]] = (request or ID3.request_tag_value)(tags, node[1], filename)
+
+            string += tags[node[1]]
+        elif _test_compiled_condition(node[1], tags):
+            string += _evaluate(node[2], tags, filename, request=request)
+
+    return string
+
+
+def _referenced_tags(nodes):
+    names = set()
+
+    for node in nodes:
+        if node[0] == 'tag':
+            names.add(node[1])
+        elif node[0] == 'condition':
+            for condition, steps in node[1]:
+                if len(steps) == 0:
+                    names.add(condition)
+                names.update(step[0] for step in steps)
+
+            names |= _referenced_tags(node[2])
+
+    return names
+
+
+def _required_tags(nodes):
+    names = set()
+
+    for node in nodes:
+        if node[0] == 'tag' and node[2]:
+            names.add(node[1])
+        elif node[0] == 'condition':
+            names |= _required_tags(node[2])
+
+    return names
+
+
 def _clean(string):
     if string is None:
         return None
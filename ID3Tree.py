@@ -1,21 +1,123 @@
+import os
 import re
+import sys
 
 import ID3
-import ID3Formatter
+import Instrumentation
+import Locality
+from TagResolver import TagResolver
+from Track import Track
 from Tree import Tree
 
 
 class ID3Tree(Tree):
-    def __init__(self, destination, path_format, filenames):
+    def __init__(self, destination, path_format, filenames, jobs=1, cache=None, resolver=None, io_workers=0,
+                 readahead=None, locality=0, albums=False):
         super().__init__(destination)
 
-        for filename in filenames:
-            child_tree = re.sub('//+', '/',
-                                ID3Formatter.format_path(path_format, ID3.get_tags(filename), filename)).split('/')
-            child_tree[-1] = {
-                'name': child_tree[-1],
-                'src': filename,
-                'dst': '{}/{}'.format(destination, '/'.join(child_tree))
-            }
+        self.destination = destination
+        self.resolver = resolver if resolver is not None else TagResolver()
 
-            super().add_child_tree(child_tree)
+        for filename, path in path_iter(path_format, filenames, jobs, cache, self.resolver, io_workers, readahead,
+                                        locality, albums):
+            self.add_track(filename, path)
+
+    def add_track(self, filename, path):
+        child_tree = split_path(path)
+        directory = super().add_child_tree(child_tree[:-1])
+
+        return directory.add_child_tree((Track(child_tree[-1], filename, directory),))
+
+    def merge(self, other):
+        for leaf in other.leaf_iter():
+            values = []
+            node = leaf
+
+            while node.parent is not None:
+                values.append(node.value.__str__())
+                node = node.parent
+
+            self.add_track(leaf.value.src, '/'.join(values[::-1])).value.link = leaf.value.link
+
+    def order_by_locality(self):
+        self.sort_by(lambda node: Locality.physical_key(node.value.src) if node is not self else (0, 0, 0))
+
+    def leaf_iter(self):
+        for item in super().leaf_iter():
+            if item is not self:
+                yield item
+
+    def remove_leaf(self, leaf):
+        node = leaf
+
+        while node.parent is not None:
+            parent = node.parent
+            parent.remove_child(node)
+
+            if not parent.is_leaf():
+                break
+
+            node = parent
+
+
+def path_iter(path_format, filenames, jobs=1, cache=None, resolver=None, io_workers=0, readahead=None, locality=0,
+              albums=False):
+    resolver = resolver if resolver is not None else TagResolver()
+    stats = Instrumentation.stats
+    total = len(filenames) if hasattr(filenames, '__len__') else None
+    results = ID3.tag_iter(filenames, jobs, cache, io_workers, readahead, locality)
+
+    if albums:
+        results = release_iter(results, resolver)
+
+    for done, (filename, tags) in enumerate(results, 1):
+        with stats.stage('format'):
+            path = resolver.try_format(path_format, tags, filename)
+
+        if path is None:
+            resolver.defer(filename, tags)
+        else:
+            yield filename, path
+
+        stats.progress('Reading tags', done, total)
+
+    stats.end_progress()
+
+    with stats.stage('resolve'):
+        for filename, tags, path in resolver.resolve(path_format):
+            yield filename, path
+
+
+def release_iter(results, resolver):
+    stats = Instrumentation.stats
+    release = []
+
+    def unify():
+        conflicts = {}
+
+        for filename, tag, value, chosen in ID3.unify_release(release):
+            conflicts.setdefault(filename, []).append('{} "{}" -> "{}"'.format(tag, value, chosen))
+
+        for filename, changes in conflicts.items():
+            stats.count('release conflicts')
+            resolver.error('"{}" disagrees with the rest of its release: {}'.format(filename, ', '.join(changes)))
+
+        stats.count('releases')
+        return release
+
+    for filename, tags in results:
+        if len(release) > 0 and os.path.dirname(filename) != os.path.dirname(release[0][0]):
+            for item in unify():
+                yield item
+
+            release = []
+
+        release.append((filename, tags))
+
+    if len(release) > 0:
+        for item in unify():
+            yield item
+
+
+def split_path(path):
+    return [sys.intern(part) for part in re.sub('//+', '/', path).split('/')]
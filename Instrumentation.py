@@ -0,0 +1,129 @@
+import collections
+import contextlib
+import heapq
+import json
+import sys
+import time
+
+
+class Stats:
+    def __init__(self, errfile=sys.stderr, progress=False, slowest=10, progress_interval=0.5):
+        self.errfile = errfile
+        self.show_progress = progress
+        self.slowest_count = slowest
+        self.progress_interval = progress_interval
+
+        self.started = time.time()
+        self.stages = collections.OrderedDict()
+        self.active = []
+        self.counters = collections.OrderedDict()
+        self.slowest = []
+
+        self._progress_stage = None
+        self._progress_start = 0
+        self._progress_shown = 0
+        self._progress_width = 0
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        self.active.append(name)
+
+        try:
+            yield
+        finally:
+            self.active.pop()
+            self.add_time(name, time.perf_counter() - wall, time.process_time() - cpu)
+
+    def add_time(self, name, wall, cpu=0.0):
+        if name not in self.stages:
+            self.stages[name] = [0.0, 0.0, self.active[-1] if len(self.active) > 0 else None]
+
+        self.stages[name][0] += wall
+        self.stages[name][1] += cpu
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record_file(self, filename, seconds):
+        if self.slowest_count <= 0:
+            return
+
+        if len(self.slowest) < self.slowest_count:
+            heapq.heappush(self.slowest, (seconds, filename))
+        elif seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (seconds, filename))
+
+    def progress(self, stage, done, total=None):
+        if not self.show_progress:
+            return
+
+        now = time.time()
+
+        if stage != self._progress_stage:
+            self._progress_stage = stage
+            self._progress_start = now
+            self._progress_shown = 0
+
+        if now - self._progress_shown < self.progress_interval and (total is None or done < total):
+            return
+
+        self._progress_shown = now
+        elapsed = now - self._progress_start
+        rate = done / elapsed if elapsed > 0 else 0.0
+        line = '{}: {}'.format(stage, done)
+
+        if total is not None:
+            line += '/{} ({:.0f}%)'.format(total, done * 100 / max(total, 1))
+
+        line += ' {:.0f}/s'.format(rate)
+
+        if total is not None and rate > 0:
+            line += ' ETA {}'.format(_duration((total - done) / rate))
+
+        self._write('\r' + line.ljust(self._progress_width), '')
+        self._progress_width = len(line)
+
+    def end_progress(self):
+        if self._progress_width > 0:
+            self._write('')
+            self._progress_width = 0
+
+        self._progress_stage = None
+
+    def report(self):
+        return collections.OrderedDict((
+            ('elapsed', time.time() - self.started),
+            ('stages', collections.OrderedDict(
+                (name, {'wall': times[0], 'cpu': times[1], 'within': times[2]}) for name, times in self.stages.items()
+            )),
+            ('counters', self.counters),
+            ('slowest_files', [
+                {'file': filename, 'seconds': seconds} for seconds, filename in sorted(self.slowest, reverse=True)
+            ]),
+        ))
+
+    def dump(self, filename):
+        with open(filename, 'w') as file:
+            json.dump(self.report(), file, indent=2)
+
+    def _write(self, message, postfix='\n'):
+        write_line(self.errfile, message, postfix)
+        self.errfile.flush()
+
+
+def _duration(seconds):
+    seconds = int(seconds)
+
+    return '{}:{:02d}:{:02d}'.format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+def write_line(file, message, postfix='\n'):
+    try:
+        file.write(message + postfix)
+    except TypeError:
+        file.write(bytes(message + postfix, 'utf-8'))
+
+
+stats = Stats()
@@ -0,0 +1,191 @@
+import json
+import os
+import sys
+import time
+
+import FileScanner
+import Instrumentation
+
+
+class LinkView:
+    kinds = ('symlink', 'hard')
+    manifest_name = '.music-organizer-view'
+
+    def __init__(self, dest, keep_formats, kind='symlink', errfile=sys.stderr, extras=None):
+        if kind not in self.kinds:
+            raise Exception('"{}" is not a recognized view kind, expected one of {}'.format(kind, self.kinds))
+
+        self.dest = dest
+        self.keep_formats = keep_formats
+        self.kind = kind
+        self.errfile = errfile
+        self.extras = extras
+        self.manifest = os.path.join(dest, self.manifest_name)
+
+        self.added = 0
+        self.retargeted = 0
+        self.removed = 0
+        self.unchanged = 0
+        self.failures = 0
+
+    def write_changes(self, id3_tree, orphans=()):
+        start = time.time()
+        stats = Instrumentation.stats
+        links = self.link_map(id3_tree)
+        previous = self.load_manifest()
+        owned = set()
+
+        self.create_directories(links)
+
+        for done, (path, src) in enumerate(links.items(), 1):
+            if self.update_link(path, src, path in previous):
+                owned.add(path)
+
+            stats.progress('Linking', done, len(links))
+
+        stats.end_progress()
+
+        for path in previous:
+            if path not in links and not self.remove_link(path):
+                owned.add(path)
+
+        self.save_manifest(owned)
+
+        stats.count('links added', self.added)
+        stats.count('links retargeted', self.retargeted)
+        stats.count('links removed', self.removed)
+        stats.count('failures', self.failures)
+
+        for orphan in orphans:
+            self.error('Orphaned file: "{}"'.format(orphan))
+
+        self.error(self.summary(time.time() - start))
+
+    def link_map(self, id3_tree):
+        links = {}
+        targets = {}
+
+        for item in id3_tree.leaf_iter():
+            FileScanner.add_extras_target(targets, item.value.src_directory, item.parent.get_tree_path())
+            links[os.path.relpath(item.value.dst, self.dest)] = item.value.src
+
+        for src_directory, directory in targets.items():
+            for src in FileScanner.keep_files(src_directory, self.keep_formats, self.extras):
+                links.setdefault(os.path.relpath(os.path.join(directory, os.path.basename(src)), self.dest), src)
+
+        return links
+
+    def create_directories(self, links):
+        directories = sorted({os.path.dirname(path) for path in links}, reverse=True)
+        created = None
+
+        for directory in directories:
+            if created is not None and created.startswith(directory + '/'):
+                continue
+
+            created = directory
+
+            try:
+                os.makedirs(os.path.join(self.dest, directory), exist_ok=True)
+            except OSError as error:
+                self.failures += 1
+                self.error('Failed to create directory "{}": {}'.format(os.path.join(self.dest, directory), error))
+
+    def update_link(self, path, src, owned):
+        dst = os.path.join(self.dest, path)
+
+        try:
+            current = os.lstat(dst)
+        except FileNotFoundError:
+            current = None
+        except OSError as error:
+            self.failures += 1
+            self.error('Failed to check "{}": {}'.format(dst, error))
+            return owned
+
+        try:
+            if current is None:
+                self.make_link(src, dst)
+                self.added += 1
+            elif self.points_to(dst, current, src):
+                self.unchanged += 1
+            elif owned:
+                self.make_link(src, dst + '.view-tmp')
+                os.replace(dst + '.view-tmp', dst)
+                self.retargeted += 1
+            else:
+                self.failures += 1
+                self.error('Not replacing "{}", it is not part of the view'.format(dst))
+                return False
+        except OSError as error:
+            self.failures += 1
+            self.error('Failed to link "{}" to "{}": {}'.format(dst, src, error))
+            return owned and os.path.lexists(dst)
+
+        return True
+
+    def points_to(self, dst, current, src):
+        if self.kind == 'symlink':
+            return os.path.islink(dst) and os.readlink(dst) == src
+
+        try:
+            target = os.stat(src)
+        except OSError:
+            return False
+
+        return (current.st_dev, current.st_ino) == (target.st_dev, target.st_ino)
+
+    def make_link(self, src, dst):
+        if os.path.lexists(dst):
+            os.unlink(dst)
+
+        if self.kind == 'symlink':
+            os.symlink(src, dst)
+        else:
+            os.link(src, dst)
+
+    def remove_link(self, path):
+        dst = os.path.join(self.dest, path)
+
+        try:
+            if os.path.lexists(dst):
+                os.unlink(dst)
+                self.removed += 1
+        except OSError as error:
+            self.failures += 1
+            self.error('Failed to remove "{}": {}'.format(dst, error))
+            return False
+
+        directory = os.path.dirname(dst)
+
+        try:
+            while directory != self.dest and len(os.listdir(directory)) == 0:
+                os.rmdir(directory)
+                directory = os.path.dirname(directory)
+        except OSError:
+            pass
+
+        return True
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest, encoding='utf-8') as file:
+                return set(json.load(file))
+        except (OSError, ValueError):
+            return set()
+
+    def save_manifest(self, owned):
+        os.makedirs(self.dest, exist_ok=True)
+
+        with open(self.manifest + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(sorted(owned), file)
+
+        os.replace(self.manifest + '.tmp', self.manifest)
+
+    def summary(self, elapsed):
+        return 'View "{}": {} links added, {} retargeted, {} removed, {} unchanged in {:.2f}s, {} failures'.format(
+            self.dest, self.added, self.retargeted, self.removed, self.unchanged, elapsed, self.failures
+        )
+
+    def error(self, message):
+        Instrumentation.write_line(self.errfile, message)
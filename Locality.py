@@ -0,0 +1,46 @@
+import fcntl
+import os
+import struct
+
+_fs_ioc_fiemap = 0xc020660b
+_fiemap_header = struct.Struct('=QQIIII')
+_fiemap_extent = struct.Struct('=QQQQQIIII')
+
+
+def physical_key(filename):
+    try:
+        with open(filename, 'rb') as file:
+            stat = os.fstat(file.fileno())
+            offset = first_extent(file.fileno())
+    except OSError:
+        return 0, 0, 0
+
+    return stat.st_dev, 0 if offset is not None else 1, offset if offset is not None else stat.st_ino
+
+
+def first_extent(fd):
+    request = bytearray(_fiemap_header.pack(0, 0xffffffffffffffff, 0, 0, 1, 0) + bytes(_fiemap_extent.size))
+
+    try:
+        fcntl.ioctl(fd, _fs_ioc_fiemap, request, True)
+    except OSError:
+        return None
+
+    if _fiemap_header.unpack_from(request)[3] == 0:
+        return None
+
+    return _fiemap_extent.unpack_from(request, _fiemap_header.size)[1]
+
+
+def chunks(items, chunk_size=4096):
+    chunk = []
+
+    for item in items:
+        chunk.append(item)
+
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+
+    if len(chunk) > 0:
+        yield chunk
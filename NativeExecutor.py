@@ -0,0 +1,202 @@
+import os
+import shutil
+import sys
+import threading
+import time
+
+import FileScanner
+import Instrumentation
+import Parallel
+
+
+class NativeExecutor:
+    operations = ('copy', 'move', 'link')
+
+    def __init__(self, root, dest, keep_formats, operation='copy', workers=8, errfile=sys.stderr, extras=None,
+                 journal=None):
+        if operation not in self.operations:
+            raise Exception('"{}" is not a recognized operation, expected one of {}'.format(operation, self.operations))
+
+        self.root = root
+        self.dest = dest
+        self.keep_formats = keep_formats
+        self.operation = operation
+        self.workers = workers
+        self.errfile = errfile
+        self.extras = extras
+        self.journal = journal
+
+        self.files = 0
+        self.bytes = 0
+        self.failures = 0
+        self.resumed = 0
+        self.links = []
+        self._lock = threading.Lock()
+
+    def write_changes(self, id3_tree, orphans=()):
+        start = time.time()
+        stats = Instrumentation.stats
+        total = sum(1 for _ in id3_tree.leaf_iter()) if stats.show_progress else None
+        done = 0
+
+        with Parallel.thread_pool(self.workers) as pool:
+            for task, error in Parallel.ordered_map(self.run_task, self.task_iter(id3_tree), pool, self.workers * 4):
+                if error is not None:
+                    self.failures += 1
+                    self.error('Failed to {} "{}" to "{}": {}'.format(self.operation, task[0], task[1], error))
+
+                if task[2] == self.operation:
+                    done += 1
+                    stats.progress('Organizing', done, total)
+
+        for primary, dst in self.links:
+            error = self.link_duplicate(primary, dst)
+
+            if error is not None:
+                self.failures += 1
+                self.error('Failed to link "{}" to "{}": {}'.format(dst, primary, error))
+
+            done += 1
+            stats.progress('Organizing', done, total)
+
+        stats.end_progress()
+        stats.count('files organized', self.files)
+        stats.count('bytes organized', self.bytes)
+        stats.count('failures', self.failures)
+        stats.count('operations resumed', self.resumed)
+
+        for orphan in orphans:
+            self.error('Orphaned file: "{}"'.format(orphan))
+
+        self.error(self.summary(time.time() - start))
+
+    def task_iter(self, id3_tree):
+        created = set()
+        failed = set()
+        targets = {}
+
+        for item in id3_tree.leaf_iter():
+            directory = item.parent.get_tree_path()
+
+            if directory in failed:
+                continue
+
+            if directory not in created:
+                try:
+                    if not os.path.isdir(directory):
+                        Instrumentation.stats.count('directories created')
+                    os.makedirs(directory, exist_ok=True)
+                except OSError as error:
+                    failed.add(directory)
+                    self.failures += 1
+                    self.error('Failed to create directory "{}", skipping its files: {}'.format(directory, error))
+                    continue
+
+                created.add(directory)
+
+            FileScanner.add_extras_target(targets, item.value.src_directory, directory)
+
+            if self.is_done(item.value.dst):
+                continue
+
+            if item.value.link is not None:
+                self.links.append((item.value.link, item.value.dst))
+            else:
+                yield item.value.src, item.value.dst, self.operation
+
+        for src_directory, directory in targets.items():
+            for src in FileScanner.keep_files(src_directory, self.keep_formats, self.extras):
+                if not self.is_done(os.path.join(directory, os.path.basename(src))):
+                    yield src, os.path.join(directory, os.path.basename(src)), 'keep'
+
+    def is_done(self, dst):
+        if self.journal is None or not self.journal.is_done(dst):
+            return False
+
+        self.resumed += 1
+        return True
+
+    def run_task(self, task):
+        src, dst, operation = task
+
+        try:
+            src_stat = os.stat(src)
+            same_device = os.stat(os.path.dirname(dst)).st_dev == src_stat.st_dev
+
+            if operation == 'move' and same_device:
+                os.rename(src, dst)
+            elif operation == 'link' and same_device:
+                if os.path.lexists(dst):
+                    os.unlink(dst)
+                os.link(src, dst)
+            else:
+                copy_file(src, dst)
+
+                if operation == 'move':
+                    os.unlink(src)
+        except OSError as error:
+            return error
+
+        with self._lock:
+            self.files += 1
+            self.bytes += src_stat.st_size
+
+            if self.journal is not None:
+                self.journal.record(src, dst)
+
+        return None
+
+    def link_duplicate(self, primary, dst):
+        try:
+            if os.path.lexists(dst):
+                os.unlink(dst)
+            os.link(primary, dst)
+        except OSError as error:
+            return error
+
+        with self._lock:
+            self.files += 1
+
+            if self.journal is not None:
+                self.journal.record(primary, dst)
+
+        return None
+
+    def summary(self, elapsed):
+        summary = '{} {} files ({:.1f} MiB) in {:.2f}s, {:.1f} MiB/s, {} failures'.format(
+            {'copy': 'Copied', 'move': 'Moved', 'link': 'Linked'}[self.operation], self.files,
+            self.bytes / 1048576, elapsed, self.bytes / 1048576 / max(elapsed, 1e-9), self.failures
+        )
+
+        if self.resumed > 0:
+            summary += ', {} skipped as already done'.format(self.resumed)
+
+        return summary
+
+    def error(self, message):
+        with self._lock:
+            Instrumentation.write_line(self.errfile, message)
+
+
+def copy_file(src, dst):
+    with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+        remaining = os.fstat(src_file.fileno()).st_size
+
+        try:
+            while remaining > 0:
+                if hasattr(os, 'copy_file_range'):
+                    copied = os.copy_file_range(src_file.fileno(), dst_file.fileno(), remaining)
+                else:
+                    copied = os.sendfile(dst_file.fileno(), src_file.fileno(), None, remaining)
+
+                if copied == 0:
+                    break
+
+                remaining -= copied
+        except OSError:
+            src_file.seek(0)
+            dst_file.seek(0)
+            dst_file.truncate()
+            shutil.copyfileobj(src_file, dst_file)
+
+    shutil.copymode(src, dst)
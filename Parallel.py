@@ -0,0 +1,77 @@
+import collections
+import concurrent.futures
+
+
+def ordered_map(function, items, executor, window=64):
+    pending = collections.deque()
+
+    for item in items:
+        pending.append((item, executor.submit(function, item)))
+
+        if len(pending) >= window:
+            yield _resolve(pending.popleft())
+
+    while len(pending) > 0:
+        yield _resolve(pending.popleft())
+
+
+def ordered_batch_map(function, items, executor, batch_size=32, window=8, known=None):
+    def batches():
+        batch = []
+
+        for item in items:
+            batch.append((item, known(item) if known is not None else None))
+
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+
+        if len(batch) > 0:
+            yield batch
+
+    def run_batch(batch):
+        missing = [item for item, result in batch if result is None]
+
+        if len(missing) == 0:
+            return _done([])
+
+        return executor.submit(function, missing)
+
+    pending = collections.deque()
+
+    for batch in batches():
+        pending.append((batch, run_batch(batch)))
+
+        if len(pending) >= window:
+            for item, result in _merge(*pending.popleft()):
+                yield item, result
+
+    while len(pending) > 0:
+        for item, result in _merge(*pending.popleft()):
+            yield item, result
+
+
+def _merge(batch, future):
+    results = iter(future.result())
+
+    for item, result in batch:
+        yield item, result if result is not None else next(results)
+
+
+def _resolve(pending):
+    return pending[0], pending[1].result()
+
+
+def _done(result):
+    future = concurrent.futures.Future()
+    future.set_result(result)
+
+    return future
+
+
+def process_pool(workers):
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+
+
+def thread_pool(workers):
+    return concurrent.futures.ThreadPoolExecutor(max_workers=workers)
@@ -0,0 +1,88 @@
+import json
+import os
+
+from ID3Tree import ID3Tree
+
+version = 1
+
+
+def save(filename, id3_tree, root, extras=None):
+    with open(filename, 'w', encoding='utf-8') as file:
+        file.write(json.dumps({'version': version, 'root': root, 'destination': id3_tree.destination}) + '\n')
+
+        written = set()
+
+        for item in id3_tree.leaf_iter():
+            track = item.value
+            path = track.dst[len(id3_tree.destination) + 1:]
+            file.write(json.dumps(['t', path, track.src, track.link]) + '\n')
+
+            if extras is not None and track.src_directory not in written:
+                written.add(track.src_directory)
+
+                if track.src_directory in extras:
+                    file.write(json.dumps(['x', track.src_directory, extras[track.src_directory]]) + '\n')
+
+
+def load(filename):
+    with open(filename, encoding='utf-8') as file:
+        header = json.loads(file.readline())
+
+        if header.get('version') != version:
+            raise Exception('"{}" is not a version {} plan file'.format(filename, version))
+
+        id3_tree = ID3Tree(header['destination'], None, [])
+        extras = {}
+
+        for line in file:
+            record = json.loads(line)
+
+            if record[0] == 't':
+                id3_tree.add_track(record[2], record[1]).value.link = record[3]
+            elif record[0] == 'x':
+                extras[record[1]] = record[2]
+
+    return header, id3_tree, extras
+
+
+class Journal:
+    def __init__(self, filename, sync_interval=100):
+        self.filename = filename
+        self.sync_interval = sync_interval
+        self.completed = set()
+        self._unsynced = 0
+
+        complete = True
+
+        if os.path.exists(filename):
+            with open(filename, encoding='utf-8') as file:
+                for line in file:
+                    complete = line.endswith('\n')
+
+                    try:
+                        self.completed.add(json.loads(line)[1])
+                    except ValueError:
+                        continue
+
+        self.file = open(filename, 'a', encoding='utf-8')
+
+        if not complete:
+            self.file.write('\n')
+
+    def is_done(self, dst):
+        return dst in self.completed
+
+    def record(self, src, dst):
+        self.completed.add(dst)
+        self.file.write(json.dumps([src, dst]) + '\n')
+        self.file.flush()
+
+        self._unsynced += 1
+        if self._unsynced >= self.sync_interval:
+            os.fsync(self.file.fileno())
+            self._unsynced = 0
+
+    def close(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
@@ -20,5 +20,37 @@ class RuntimeOptions:
         self.keep_formats = (
             'jpg', 'jpeg', 'jif', 'jfif', 'png', 'bmp', 'tiff', 'gif', 'pdf', 'txt'
         )
+        self.jobs = 1
+        self.io_workers = 8
+        self.tag_io_workers = 0
+        self.readahead = None
+        self.locality = 0
+        self.albums = False
+        self.snapshot = None
+        self.full_rescan = False
+        self.operation = None
+        self.command_workers = 1
+        self.command_timeout = None
+        self.command_retries = 0
+        self.view = None
+        self.dedup = None
+        self.stream = False
+        self.shards = 1
+        self.extras = None
+        self.plan_in = None
+        self.plan_out = None
+        self.journal = None
+        self.sort_buffer = 20000
+        self.sync = False
+        self.sync_hash = False
+        self.answers = None
+        self.interactive = True
+        self.progress = False
+        self.stats_file = None
+        self.watch = False
+        self.settle_seconds = 5.0
+        self.watch_retries = 3
+        self.tag_cache = None
+        self.prune_cache = False
         self.outfile = sys.stdout
         self.errfile = sys.stderr
@@ -0,0 +1,81 @@
+import json
+import sqlite3
+import time
+
+
+class ScanSnapshot:
+    def __init__(self, filename, settings, rescan=False, commit_interval=1000, settle_ns=2000000000):
+        self.filename = filename
+        self.rescan = rescan
+        self.commit_interval = commit_interval
+        self.settle_ns = settle_ns
+        self.reused = 0
+        self.listed = 0
+        self.seen = set()
+        self._uncommitted = 0
+
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS settings (value TEXT)')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS directories ('
+            'path TEXT PRIMARY KEY, mtime INTEGER, listed INTEGER, files TEXT, directories TEXT, extras TEXT)'
+        )
+
+        settings = json.dumps(settings, sort_keys=True)
+        row = self.connection.execute('SELECT value FROM settings').fetchone()
+
+        if row is None or row[0] != settings:
+            self.connection.execute('DELETE FROM settings')
+            self.connection.execute('DELETE FROM directories')
+            self.connection.execute('INSERT INTO settings (value) VALUES (?)', (settings,))
+            self.commit()
+
+    def get(self, directory, mtime):
+        self.seen.add(directory)
+
+        if self.rescan:
+            return None
+
+        row = self.connection.execute(
+            'SELECT mtime, listed, files, directories, extras FROM directories WHERE path = ?', (directory,)
+        ).fetchone()
+
+        if row is None or row[0] != mtime or row[1] - mtime < self.settle_ns:
+            return None
+
+        self.reused += 1
+        return json.loads(row[2]), json.loads(row[3]), json.loads(row[4])
+
+    def put(self, directory, mtime, files, directories, extras):
+        self.listed += 1
+        self.connection.execute(
+            'INSERT OR REPLACE INTO directories (path, mtime, listed, files, directories, extras) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (directory, mtime, int(time.time() * 1000000000), json.dumps(files), json.dumps(directories),
+             json.dumps(extras))
+        )
+
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_interval:
+            self.commit()
+
+    def prune_unseen(self):
+        stale = [
+            (path,) for path, in self.connection.execute('SELECT path FROM directories') if path not in self.seen
+        ]
+
+        self.connection.executemany('DELETE FROM directories WHERE path = ?', stale)
+        self.commit()
+
+        return len(stale)
+
+    def commit(self):
+        self.connection.commit()
+        self._uncommitted = 0
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+    def summary(self):
+        return 'Scan snapshot "{}": {} directories reused, {} listed'.format(self.filename, self.reused, self.listed)
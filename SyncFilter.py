@@ -0,0 +1,91 @@
+import hashlib
+import os
+
+from LinkView import LinkView
+
+
+class SyncFilter:
+    def __init__(self, dest, keep_formats, use_hash=False):
+        self.dest = dest
+        self.keep_formats = keep_formats
+        self.use_hash = use_hash
+
+        self.current = 0
+        self.changed = 0
+        self.new = 0
+        self.orphans = []
+
+    def apply(self, id3_tree, find_orphans=True):
+        planned = set()
+        current = []
+
+        for item in id3_tree.leaf_iter():
+            planned.add(item.value.dst)
+
+            if self.is_current(item.value.src, item.value.dst):
+                current.append(item)
+
+        for item in current:
+            id3_tree.remove_leaf(item)
+
+        if find_orphans:
+            self.orphans = list(self.orphan_iter(planned))
+
+    def is_current(self, src, dst):
+        try:
+            dst_stat = os.stat(dst)
+        except FileNotFoundError:
+            self.new += 1
+            return False
+        except OSError:
+            self.changed += 1
+            return False
+
+        try:
+            src_stat = os.stat(src)
+
+            if src_stat.st_size == dst_stat.st_size:
+                if self.use_hash:
+                    up_to_date = file_hash(src) == file_hash(dst)
+                else:
+                    up_to_date = dst_stat.st_mtime_ns >= src_stat.st_mtime_ns
+
+                if up_to_date:
+                    self.current += 1
+                    return True
+        except OSError:
+            pass
+
+        self.changed += 1
+        return False
+
+    def orphan_iter(self, planned):
+        if not os.path.isdir(self.dest):
+            return
+
+        stack = [self.dest]
+        manifest = os.path.join(self.dest, LinkView.manifest_name)
+
+        while len(stack) > 0:
+            with os.scandir(stack.pop()) as entries:
+                for entry in sorted(entries, key=lambda entry: entry.name, reverse=True):
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.path not in planned and entry.path != manifest and \
+                            os.path.splitext(entry.name)[1][1:] not in self.keep_formats:
+                        yield entry.path
+
+    def summary(self):
+        return 'Sync: {} up to date, {} changed, {} new, {} orphaned'.format(
+            self.current, self.changed, self.new, len(self.orphans)
+        )
+
+
+def file_hash(filename, chunk_size=1048576):
+    digest = hashlib.sha1()
+
+    with open(filename, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
@@ -0,0 +1,114 @@
+import json
+import os
+import sqlite3
+
+
+class TagCache:
+    def __init__(self, filename, commit_interval=1000):
+        self.filename = filename
+        self.commit_interval = commit_interval
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self._uncommitted = 0
+        self.pending = {}
+
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS tags ('
+            'path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, inode INTEGER, data TEXT, audio_hash TEXT)'
+        )
+
+        columns = [row[1] for row in self.connection.execute('PRAGMA table_info(tags)')]
+        if 'audio_hash' not in columns:
+            self.connection.execute('ALTER TABLE tags ADD COLUMN audio_hash TEXT')
+
+    def get(self, filename):
+        signature = self.signature(filename)
+        row = self.connection.execute(
+            'SELECT size, mtime, inode, data FROM tags WHERE path = ?', (filename,)
+        ).fetchone()
+
+        if row is None or row[3] is None:
+            self.misses += 1
+        elif tuple(row[:3]) != signature:
+            self.invalidated += 1
+        else:
+            self.hits += 1
+            return json.loads(row[3])
+
+        self.pending[filename] = signature
+        return None
+
+    def put(self, filename, tags):
+        signature = self.pending.pop(filename, None) or self.signature(filename)
+
+        self.connection.execute(
+            'INSERT OR REPLACE INTO tags (path, size, mtime, inode, data) VALUES (?, ?, ?, ?, ?)',
+            (filename,) + signature + (json.dumps(tags),)
+        )
+
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_interval:
+            self.commit()
+
+    def get_hash(self, filename):
+        row = self.connection.execute(
+            'SELECT size, mtime, inode, audio_hash FROM tags WHERE path = ?', (filename,)
+        ).fetchone()
+
+        if row is None or tuple(row[:3]) != self.signature(filename):
+            return None
+
+        return row[3]
+
+    def put_hash(self, filename, audio_hash):
+        signature = self.signature(filename)
+        updated = self.connection.execute(
+            'UPDATE tags SET audio_hash = ? WHERE path = ? AND size = ? AND mtime = ? AND inode = ?',
+            (audio_hash, filename) + signature
+        ).rowcount
+
+        if updated == 0:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO tags (path, size, mtime, inode, data, audio_hash) VALUES (?, ?, ?, ?, NULL, ?)',
+                (filename,) + signature + (audio_hash,)
+            )
+
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_interval:
+            self.commit()
+
+    def prune(self):
+        stale = []
+
+        for path, size, mtime, inode in self.connection.execute('SELECT path, size, mtime, inode FROM tags'):
+            try:
+                if self.signature(path) != (size, mtime, inode):
+                    stale.append((path,))
+            except OSError:
+                stale.append((path,))
+
+        self.connection.executemany('DELETE FROM tags WHERE path = ?', stale)
+        self.commit()
+
+        return len(stale)
+
+    def commit(self):
+        self.connection.commit()
+        self._uncommitted = 0
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+    def summary(self):
+        return 'Tag cache "{}": {} hits, {} misses, {} invalidated'.format(
+            self.filename, self.hits, self.misses, self.invalidated
+        )
+
+    @staticmethod
+    def signature(filename):
+        stat = os.stat(filename)
+
+        return stat.st_size, stat.st_mtime_ns, stat.st_ino
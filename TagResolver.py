@@ -0,0 +1,167 @@
+import collections
+import json
+import sys
+
+import ID3
+import ID3Formatter
+import Instrumentation
+
+
+class TagResolver:
+    def __init__(self, answers=None, interactive=True, errfile=sys.stderr, max_passes=3):
+        self.answers = answers if answers is not None else {}
+        self.interactive = interactive
+        self.errfile = errfile
+        self.max_passes = max_passes
+
+        self.deferred = []
+        self.unresolved = []
+        self.prompts = 0
+
+    def try_format(self, string_format, tags, filename):
+        missing = []
+
+        def record(record_tags, tag, record_filename):
+            missing.append(tag)
+            return None
+
+        completed = ID3.complete_tags(dict(tags), filename, record)
+
+        if len(missing) == 0:
+            path = ID3Formatter.format_path(string_format, completed, filename, _placeholder(record))
+
+            if len(missing) == 0:
+                return path
+
+        return None
+
+    def missing_tags(self, string_format, tags, filename):
+        missing = []
+
+        def record(record_tags, tag, record_filename):
+            missing.append(tag)
+            return None
+
+        ID3Formatter.format_path(
+            string_format, ID3.complete_tags(dict(tags), filename, record), filename, _placeholder(record)
+        )
+
+        return _unique(tag.lower() for tag in missing)
+
+    def defer(self, filename, tags):
+        self.deferred.append((filename, tags))
+
+    def resolve(self, string_format):
+        pending = self.deferred
+        self.deferred = []
+
+        for _ in range(self.max_passes):
+            if len(pending) == 0:
+                break
+
+            self._resolve_pass(string_format, pending)
+
+            remaining = []
+
+            for filename, tags in pending:
+                path = self.try_format(string_format, tags, filename)
+
+                if path is None:
+                    remaining.append((filename, tags))
+                else:
+                    yield filename, tags, path
+
+            pending = remaining
+
+        for filename, tags in pending:
+            self.unresolved.append(filename)
+            self.error('Skipping "{}": no value for tags {}'.format(
+                filename, ', '.join(self.missing_tags(string_format, tags, filename))
+            ))
+
+    def _resolve_pass(self, string_format, pending):
+        albums = collections.OrderedDict()
+
+        for filename, tags in pending:
+            albums.setdefault(ID3.album_key(tags), []).append((filename, tags))
+
+        for album, files in albums.items():
+            missing = {filename: self.missing_tags(string_format, tags, filename) for filename, tags in files}
+
+            for tag in _unique(tag for filename, tags in files for tag in missing[filename] if tag in ID3.album_tags):
+                value = self.answer(tag, album, None)
+
+                if value is None and album is not None and self.interactive:
+                    value = self.prompt('Enter value for tag "{}" in album "{}"{} ({} files): '.format(
+                        tag, album[1], ' by "{}"'.format(album[0]) if album[0] is not None else '',
+                        len([filename for filename, tags in files if tag in missing[filename]])
+                    ))
+
+                if value is None:
+                    continue
+
+                if album is not None:
+                    ID3.album_tag_data.setdefault(album, {})[tag] = value
+
+                for filename, tags in files:
+                    if tag in missing[filename]:
+                        tags[tag] = self.answer(tag, album, filename) or value
+
+            for filename, tags in files:
+                for tag in missing[filename]:
+                    if tags.get(tag) is not None:
+                        continue
+
+                    value = self.answer(tag, album, filename)
+
+                    if value is None and self.interactive:
+                        value = self.prompt('Enter value for tag "{}" in file "{}": '.format(tag, filename))
+
+                    if value is not None:
+                        tags[tag] = value
+
+    def answer(self, tag, album, filename):
+        if filename is not None and tag in self.answers.get('files', {}).get(filename, {}):
+            return str(self.answers['files'][filename][tag])
+
+        if album is not None and tag in ID3.album_tag_data.get(album, {}):
+            return ID3.album_tag_data[album][tag]
+
+        if album is not None and tag in self.answers.get('albums', {}).get(album[1], {}):
+            return str(self.answers['albums'][album[1]][tag])
+
+        if tag in self.answers.get('defaults', {}):
+            return str(self.answers['defaults'][tag])
+
+        return None
+
+    def prompt(self, message):
+        self.prompts += 1
+        Instrumentation.stats.count('prompts')
+
+        return ID3.prompt_value(message)
+
+    def error(self, message):
+        Instrumentation.write_line(self.errfile, message)
+
+
+def load_answers(filename):
+    with open(filename) as file:
+        if filename.endswith(('.yaml', '.yml')):
+            import yaml
+
+            return yaml.safe_load(file) or {}
+
+        return json.load(file)
+
+
+def _placeholder(record):
+    def request(tags, tag, filename):
+        record(tags, tag, filename)
+        return ''
+
+    return request
+
+
+def _unique(items):
+    return list(collections.OrderedDict.fromkeys(items))
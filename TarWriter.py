@@ -0,0 +1,119 @@
+import os
+import sys
+import tarfile
+import time
+
+import FileScanner
+import Instrumentation
+from BashWriter import track_iter
+
+
+class TarWriter:
+    def __init__(self, root, dest, keep_formats, outfile=sys.stdout, errfile=sys.stderr, extras=None):
+        self.root = root
+        self.dest = dest
+        self.keep_formats = keep_formats
+        self.outfile = outfile
+        self.errfile = errfile
+        self.extras = extras
+
+        self.files = 0
+        self.bytes = 0
+        self.failures = 0
+        self._directories = set()
+        self._targets = {}
+        self.links = []
+
+    def write_changes(self, id3_tree, orphans=()):
+        self.write_stream(track_iter(id3_tree), orphans,
+                          sum(1 for _ in id3_tree.leaf_iter()) if Instrumentation.stats.show_progress else None)
+
+    def write_stream(self, tracks, orphans=(), total=None):
+        start = time.time()
+        stats = Instrumentation.stats
+        archive = tarfile.open(fileobj=getattr(self.outfile, 'buffer', self.outfile), mode='w|',
+                               format=tarfile.PAX_FORMAT)
+
+        try:
+            for done, (directory, src, dst, link) in enumerate(tracks, 1):
+                self._add_directory(archive, directory)
+                FileScanner.add_extras_target(self._targets, os.path.dirname(src), directory)
+
+                if link is not None:
+                    self.links.append((link, dst))
+                else:
+                    self._add_file(archive, src, dst)
+
+                stats.progress('Archiving', done, total)
+
+            for src_directory, directory in self._targets.items():
+                for extra in FileScanner.keep_files(src_directory, self.keep_formats, self.extras):
+                    self._add_file(archive, extra, os.path.join(directory, os.path.basename(extra)))
+
+            for primary, dst in self.links:
+                self._add_link(archive, primary, dst)
+        finally:
+            archive.close()
+
+        stats.end_progress()
+        stats.count('files archived', self.files)
+        stats.count('bytes archived', self.bytes)
+        stats.count('failures', self.failures)
+
+        for orphan in orphans:
+            self.error('Orphaned file: "{}"'.format(orphan))
+
+        self.error(self.summary(time.time() - start))
+
+    def _add_directory(self, archive, directory):
+        name = self.archive_name(directory)
+
+        if name in self._directories or name == '':
+            return
+
+        self._add_directory(archive, os.path.dirname(directory))
+        self._directories.add(name)
+
+        info = tarfile.TarInfo(name)
+        info.type = tarfile.DIRTYPE
+        info.mode = 0o755
+        info.mtime = int(time.time())
+        archive.addfile(info)
+
+    def _add_file(self, archive, src, dst):
+        try:
+            file = open(src, 'rb')
+        except OSError as error:
+            self.failures += 1
+            self.error('Failed to archive "{}" as "{}": {}'.format(src, dst, error))
+            return
+
+        with file:
+            info = archive.gettarinfo(arcname=self.archive_name(dst), fileobj=file)
+            archive.addfile(info, file)
+
+        self.files += 1
+        self.bytes += info.size
+
+    def _add_link(self, archive, primary, dst):
+        info = tarfile.TarInfo(self.archive_name(dst))
+        info.type = tarfile.LNKTYPE
+        info.linkname = self.archive_name(primary)
+        info.mtime = int(time.time())
+        archive.addfile(info)
+
+        self.files += 1
+
+    def archive_name(self, path):
+        name = os.path.relpath(path, self.dest)
+
+        return name if name != '.' else ''
+
+    def summary(self, elapsed):
+        return 'Archived {} files ({:.1f} MiB) in {:.2f}s, {:.1f} MiB/s, {} failures'.format(
+            self.files, self.bytes / 1048576, elapsed, self.bytes / 1048576 / max(elapsed, 1e-9), self.failures
+        )
+
+    def error(self, message):
+        Instrumentation.write_line(self.errfile, message)
+
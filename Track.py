@@ -0,0 +1,31 @@
+import os
+import sys
+
+
+class Track:
+    __slots__ = ('name', 'src_directory', 'src_name', 'directory', 'link')
+
+    def __init__(self, name, src, directory, link=None):
+        self.name = name
+        self.src_directory = sys.intern(os.path.dirname(src))
+        self.src_name = os.path.basename(src)
+        self.directory = directory
+        self.link = link
+
+    @property
+    def src(self):
+        return os.path.join(self.src_directory, self.src_name)
+
+    @property
+    def dst(self):
+        return self.directory.get_tree_path() + '/' + self.name
+
+    def __eq__(self, other):
+        return isinstance(other, Track) and (self.name, self.src_directory, self.src_name) == \
+            (other.name, other.src_directory, other.src_name)
+
+    def __hash__(self):
+        return hash((self.name, self.src_directory, self.src_name))
+
+    def __str__(self):
+        return self.name
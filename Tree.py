@@ -1,75 +1,141 @@
+import itertools
+import types
+
+
 class Tree:
+    __slots__ = ('value', 'parent', '_children', '_path')
+
     def __init__(self, value, parent=None):
         self.value = value
-        self.children = ()
         self.parent = parent
+        self._children = _no_children
+        self._path = None
+
+    @property
+    def children(self):
+        return self._children.values()
 
     def is_leaf(self):
-        return len(self.children) == 0
+        return len(self._children) == 0
 
     def add_child(self, child):
-        self.children += (self.get_tree(child),)
+        child = self.get_tree(child)
+        key = _key(child.value)
+
+        if key in self._children:
+            key = (_duplicate, id(child))
+
+        if self._children is _no_children:
+            self._children = {}
+
+        self._children[key] = child
+
+        return child
+
+    def remove_child(self, child):
+        key = _key(child.value)
+
+        if self._children.get(key) is not child:
+            key = next(key for key, value in self._children.items() if value is child)
+
+        del self._children[key]
 
     def add_child_tree(self, children):
-        if len(children) == 0:
-            return
+        node = self
 
-        if children[0] not in self:
-            self.add_child(children[0])
-        child = self.get_child_tree(children[0])
+        for value in children:
+            child = node.get_child_tree(value)
+            node = child if child is not None else node.add_child(value)
 
-        child.add_child_tree(children[1:])
+        return node
 
     def has_child(self, value):
-        for child in self.children:
-            if child.value == value:
-                return True
-
-        return False
+        return _key(value) in self._children
 
     def get_child_tree(self, value):
-        for child in self.children:
-            if child.value == value:
-                return child
-
-        return None
+        return self._children.get(_key(value))
 
     def depth_first_iter(self):
         yield self
 
-        dirs = ()
+        stack = [self._ordered_children()]
 
-        for child in self.children:
-            if child.is_leaf():
-                yield child
-            else:
-                dirs += (child,)
+        while len(stack) > 0:
+            child = next(stack[-1], None)
+
+            if child is None:
+                stack.pop()
+                continue
 
-        for child in dirs:
-            for element in child.depth_first_iter():
-                yield element
+            yield child
+
+            if not child.is_leaf():
+                stack.append(child._ordered_children())
 
     def leaf_iter(self):
         for item in self.depth_first_iter():
             if item.is_leaf():
                 yield item
 
+    def sort_by(self, key):
+        keys = {}
+
+        for node in reversed(list(self.depth_first_iter())):
+            if node.is_leaf():
+                keys[node] = key(node)
+            else:
+                node._children = dict(sorted(node._children.items(), key=lambda item: keys[item[1]]))
+                keys[node] = min(keys[child] for child in node._children.values())
+
     def get_tree_path(self):
-        path = self.value.__str__()
+        if self._path is not None:
+            return self._path
 
-        if self.parent is not None:
-            path = self.parent.get_tree_path() + '/' + path
+        uncached = []
+        node = self
+
+        while node is not None and node._path is None:
+            uncached.append(node)
+            node = node.parent
+
+        path = node._path if node is not None else None
+
+        for node in reversed(uncached):
+            node._path = node.value.__str__() if path is None else path + '/' + node.value.__str__()
+            path = node._path
 
         return path
 
     def get_tree(self, item):
         return item if isinstance(item, Tree) else Tree(item, parent=self)
 
+    def _ordered_children(self):
+        return itertools.chain(
+            (child for child in self._children.values() if child.is_leaf()),
+            (child for child in self._children.values() if not child.is_leaf())
+        )
+
     def __iadd__(self, other):
         self.add_child(other)
 
+        return self
+
     def __contains__(self, item):
         return self.value == item or self.has_child(item)
 
     def __str__(self):
         return '{} node: {}'.format(type(self).__name__, self.value.__str__())
+
+
+_duplicate = object()
+_no_children = types.MappingProxyType({})
+
+
+def _key(value):
+    if isinstance(value, dict):
+        return tuple(sorted((key, _key(item)) for key, item in value.items()))
+
+    if isinstance(value, list):
+        return tuple(_key(item) for item in value)
+
+    return value
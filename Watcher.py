@@ -0,0 +1,161 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+_in_modify = 0x00000002
+_in_close_write = 0x00000008
+_in_moved_from = 0x00000040
+_in_moved_to = 0x00000080
+_in_create = 0x00000100
+_in_delete = 0x00000200
+_in_delete_self = 0x00000400
+_in_q_overflow = 0x00004000
+_in_ignored = 0x00008000
+_in_isdir = 0x40000000
+
+_watch_mask = _in_modify | _in_close_write | _in_moved_from | _in_moved_to | _in_create | _in_delete | _in_delete_self
+_event_header = struct.Struct('iIII')
+
+
+class Watcher:
+    def __init__(self, root, settle_seconds=5.0, poll_interval=10.0, ignore_hidden=True):
+        self.root = os.path.realpath(root)
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.ignore_hidden = ignore_hidden
+
+        self.dirty = {}
+        self._watches = {}
+        self._mtimes = {}
+        self._fd = None
+        self._libc = None
+
+        try:
+            self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            self._fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            self._fd = None
+
+        if self._fd is not None and self._fd < 0:
+            self._fd = None
+
+        for directory in self.directory_iter(self.root):
+            self.watch(directory)
+
+    def uses_inotify(self):
+        return self._fd is not None
+
+    def directory_iter(self, root):
+        stack = [root]
+
+        while len(stack) > 0:
+            directory = stack.pop()
+            yield directory
+
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if self.ignore_hidden and entry.name.startswith('.'):
+                            continue
+                        if entry.is_dir():
+                            stack.append(os.path.realpath(entry.path) if entry.is_symlink() else entry.path)
+            except OSError:
+                continue
+
+    def watch(self, directory):
+        if self._fd is not None:
+            descriptor = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _watch_mask)
+
+            if descriptor >= 0:
+                self._watches[descriptor] = directory
+        else:
+            try:
+                self._mtimes[directory] = os.stat(directory).st_mtime_ns
+            except OSError:
+                pass
+
+    def mark(self, directory, recursive=False):
+        now = time.time()
+
+        for path in self.directory_iter(directory) if recursive else (directory,):
+            if recursive:
+                self.watch(path)
+            self.dirty[path] = now
+
+    def settled(self):
+        now = time.time()
+        ready = sorted(directory for directory, changed in self.dirty.items() if now - changed >= self.settle_seconds)
+
+        for directory in ready:
+            del self.dirty[directory]
+
+        return ready
+
+    def wait(self, timeout):
+        if self._fd is not None:
+            readable, _, _ = select.select([self._fd], [], [], timeout)
+
+            if len(readable) > 0:
+                self._read_events()
+        else:
+            time.sleep(timeout)
+            self._poll()
+
+    def events(self):
+        while True:
+            timeout = self.settle_seconds if self._fd is not None else self.poll_interval
+
+            if len(self.dirty) > 0:
+                timeout = max(0.1, min(timeout, self.settle_seconds - (time.time() - min(self.dirty.values()))))
+
+            self.wait(timeout)
+            ready = self.settled()
+
+            if len(ready) > 0:
+                yield ready
+
+    def _read_events(self):
+        data = os.read(self._fd, 65536)
+        offset = 0
+
+        while offset + _event_header.size <= len(data):
+            descriptor, mask, cookie, length = _event_header.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + _event_header.size:offset + _event_header.size + length].rstrip(b'\0'))
+            offset += _event_header.size + length
+
+            if mask & _in_q_overflow:
+                self.mark(self.root, recursive=True)
+                continue
+
+            if mask & _in_ignored:
+                self._watches.pop(descriptor, None)
+                continue
+
+            directory = self._watches.get(descriptor)
+
+            if directory is None or self.ignore_hidden and name.startswith('.'):
+                continue
+
+            if mask & _in_isdir and mask & (_in_create | _in_moved_to):
+                self.mark(os.path.join(directory, name), recursive=True)
+
+            self.dirty[directory] = time.time()
+
+    def _poll(self):
+        for directory in self.directory_iter(self.root):
+            try:
+                mtime = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue
+
+            if self._mtimes.get(directory) != mtime:
+                self._mtimes[directory] = mtime
+                self.dirty[directory] = time.time()
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
@@ -4,12 +4,29 @@
 import inspect
 import os
 import sys
+import time
 
 import ID3
-from BashWriter import BashWriter
-from FileTree import FileTree
-from ID3Tree import ID3Tree
+import ID3Formatter
+import Instrumentation
+import PlanFile
+from AudioHash import Deduplicator
+from BashWriter import BashWriter, track_iter
+from CommandScheduler import CommandScheduler
+from ExternalSorter import ExternalSorter
+from FileScanner import FileScanner
+from ID3Tree import ID3Tree, path_iter, split_path
+from Instrumentation import Stats
+from LinkView import LinkView
+from NativeExecutor import NativeExecutor
 from RuntimeOptions import RuntimeOptions
+from ScanSnapshot import ScanSnapshot
+from SyncFilter import SyncFilter
+from TagCache import TagCache
+from TarWriter import TarWriter
+from TagResolver import TagResolver, load_answers
+from Track import Track
+from Watcher import Watcher
 
 options = RuntimeOptions()
 
@@ -17,20 +34,231 @@ options = RuntimeOptions()
 def main(argv):
     parse_args(argv)
 
-    file_tree = FileTree(options.root, add_children=True)
-    id3_tree = ID3Tree(
-        options.dest, '/'.join(options.path_format),
-        [file.value for file in file_tree.file_iter() if os.path.splitext(file.value)[-1][1:] in ID3.audio_extensions]
-    )
+    if options.watch and options.run_op is not execute_changes:
+        raise Exception('Watch mode applies changes directly and needs -x')
+
+    if options.stream and (options.plan_in is not None or options.plan_out is not None):
+        raise Exception('Streaming mode does not build a plan, so it cannot read or write plan files')
+
+    if options.run_op is update_view and options.sync:
+        raise Exception('A view already refreshes incrementally and cannot be combined with -u or -H')
+
+    if options.run_op is write_manifest and options.dedup == 'link':
+        raise Exception('A manifest only lists copies and cannot express -D link, use -D skip instead')
+
+    if options.journal is not None and options.run_op is not execute_changes:
+        raise Exception('A journal records executed operations and needs -x')
+
+    if options.stream and (options.run_op not in (write_changes, write_manifest, write_archive) or options.sync or
+                           options.dedup or options.watch):
+        raise Exception('Streaming mode only writes scripts, manifests or archives and cannot be combined with -p, -x, '
+                        '-u, -H, -D or -W')
+
+    if options.run_op is write_archive and options.outfile.isatty():
+        raise Exception('Archive mode writes a tar stream and needs -o or a redirected stdout')
+
+    ID3Formatter.compile_format('/'.join(options.path_format))
+
+    stats = Instrumentation.stats = Stats(options.errfile, options.progress)
+
+    try:
+        organize(stats)
+    finally:
+        if options.stats_file is not None:
+            stats.dump(options.stats_file)
+
+
+def organize(stats):
+    cache = TagCache(options.tag_cache) if options.tag_cache is not None else None
+
+    if cache is not None and options.prune_cache:
+        log('Pruned {} stale entries from tag cache "{}"'.format(cache.prune(), cache.filename))
+
+    resolver = TagResolver(load_answers(options.answers) if options.answers is not None else None,
+                           options.interactive, options.errfile)
+
+    if options.plan_in is not None:
+        with stats.stage('load'):
+            header, id3_tree, options.extras = PlanFile.load(options.plan_in)
+
+        if options.run_op is write_manifest and any(item.value.link is not None for item in id3_tree.leaf_iter()):
+            raise Exception('Plan "{}" links duplicates, which a manifest cannot express, write it with -D skip'.format(
+                options.plan_in
+            ))
+
+        options.root = header['root']
+        options.dest = header['destination']
+        organize_tree(stats, id3_tree, cache, resolver)
+    else:
+        snapshot = None
+
+        if options.snapshot is not None:
+            snapshot = ScanSnapshot(options.snapshot, [ID3.audio_extensions, options.keep_formats, True],
+                                    options.full_rescan)
+
+        scanner = FileScanner(options.root, ID3.audio_extensions, extra_extensions=options.keep_formats,
+                              snapshot=snapshot)
+        options.extras = scanner.extras
+
+        if options.progress and not options.stream:
+            scanner = list(scanner)
+
+        if options.stream:
+            stream_changes(stats, scanner, cache, resolver)
+        else:
+            with stats.stage('tags'):
+                id3_tree = ID3Tree(options.dest, '/'.join(options.path_format), scanner, options.jobs, cache,
+                                   resolver, options.tag_io_workers, options.readahead, options.locality,
+                                   options.albums)
+
+            organize_tree(stats, id3_tree, cache, resolver)
+
+        if snapshot is not None:
+            log(snapshot.summary())
+            snapshot.close()
+
+    if cache is not None:
+        log(cache.summary())
+        cache.close()
 
-    run_op(id3_tree)
     options.outfile.flush()
     options.outfile.close()
 
 
+def organize_tree(stats, id3_tree, cache, resolver):
+    if options.dedup is not None:
+        deduplicator = Deduplicator(options.dedup, options.io_workers, cache, options.errfile)
+        deduplicator.apply(id3_tree)
+        log(deduplicator.summary())
+
+    if options.sync:
+        options.sync = SyncFilter(options.dest, options.keep_formats, options.sync_hash)
+
+        with stats.stage('sync'):
+            options.sync.apply(id3_tree)
+
+        log(options.sync.summary())
+
+    if options.locality > 0:
+        with stats.stage('locality'):
+            id3_tree.order_by_locality()
+
+    if options.plan_out is not None:
+        with stats.stage('save'):
+            PlanFile.save(options.plan_out, id3_tree, options.root, options.extras)
+
+    with stats.stage('write'):
+        options.run_op(id3_tree)
+
+    if options.watch:
+        watch(id3_tree, cache, resolver)
+
+
+def stream_changes(stats, scanner, cache, resolver):
+    def sorted_tracks():
+        sorter = ExternalSorter(lambda track: track[0].replace('/', '\0'), options.sort_buffer)
+
+        with stats.stage('tags'):
+            for filename, path in path_iter('/'.join(options.path_format), scanner, options.jobs, cache, resolver,
+                                            options.tag_io_workers, options.readahead, options.locality,
+                                            options.albums):
+                parts = split_path(path)
+                directory = '/'.join([options.dest] + parts[:-1])
+                sorter.add((directory, filename, parts[-1]))
+
+        with stats.stage('write'):
+            for directory, filename, name in sorter:
+                yield directory, filename, directory + '/' + name, None
+
+    if options.run_op is write_archive:
+        writer = TarWriter(options.root, options.dest, options.keep_formats, options.outfile, options.errfile,
+                           options.extras)
+    else:
+        writer = BashWriter(options.root, options.dest, options.command, options.keep_formats, options.outfile,
+                            options.errfile, options.shards, extras=options.extras)
+
+    if options.run_op is write_manifest:
+        writer.write_manifest(sorted_tracks())
+    else:
+        writer.write_stream(sorted_tracks())
+
+
+def watch(id3_tree, cache, resolver):
+    watcher = Watcher(options.root, options.settle_seconds)
+    scanner = FileScanner(options.root, ID3.audio_extensions, extra_extensions=options.keep_formats)
+    scanner.extras = options.extras
+    log('Watching "{}" for new files{}'.format(options.root, '' if watcher.uses_inotify() else ' (polling)'))
+    attempts = {}
+
+    try:
+        for directories in watcher.events():
+            try:
+                organize_batch(id3_tree, cache, resolver, scanner, watcher, directories)
+            except Exception as error:
+                for directory in directories:
+                    attempts[directory] = attempts.get(directory, 0) + 1
+
+                    if attempts[directory] <= options.watch_retries:
+                        watcher.mark(directory)
+                    else:
+                        del attempts[directory]
+
+                log('Failed to organize {}: {}{}'.format(
+                    ', '.join(directories), error,
+                    '' if any(directory in attempts for directory in directories) else ', giving up until they change'
+                ))
+                continue
+
+            for directory in directories:
+                attempts.pop(directory, None)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+
+def organize_batch(id3_tree, cache, resolver, scanner, watcher, directories):
+    now = time.time()
+    filenames = []
+
+    for directory in directories:
+        if not os.path.isdir(directory):
+            continue
+
+        for filename in scanner.scan_directory(directory)[0]:
+            try:
+                settled = now - os.stat(filename).st_mtime >= options.settle_seconds
+            except OSError:
+                continue
+
+            if settled:
+                filenames.append(filename)
+            else:
+                watcher.mark(directory)
+
+    if len(filenames) == 0:
+        return
+
+    batch = ID3Tree(options.dest, '/'.join(options.path_format), filenames, options.jobs, cache, resolver,
+                    options.tag_io_workers, options.readahead, options.locality, options.albums)
+    sync = SyncFilter(options.dest, options.keep_formats, options.sync_hash)
+    sync.apply(batch, find_orphans=False)
+    log('{}: {}'.format(', '.join(directories), sync.summary()))
+
+    options.run_op(batch)
+    id3_tree.merge(batch)
+
+    if cache is not None:
+        cache.commit()
+
+
+def log(message):
+    Instrumentation.write_line(options.errfile, message)
+
+
 def print_layout(tree, depth=0):
-    if type(tree.value) == dict:
-        string = '"{}"  ->  "{}"'.format(tree.value['src'], tree.value['dst'])
+    if isinstance(tree.value, Track):
+        string = '"{}"  ->  "{}"'.format(tree.value.src, tree.value.dst)
         print(' ' * 4 * depth + string)
     else:
         print(' ' * 4 * depth + tree.value)
@@ -40,9 +268,49 @@ def print_layout(tree, depth=0):
 
 
 def write_changes(tree):
+    writer = BashWriter(options.root, options.dest, options.command, options.keep_formats, options.outfile,
+                        options.errfile, options.shards, extras=options.extras)
+    writer.write_changes(tree, get_orphans())
+
+
+def write_manifest(tree):
     writer = BashWriter(options.root, options.dest, options.command, options.keep_formats, options.outfile,
                         options.errfile)
-    writer.write_changes(tree)
+    writer.write_manifest(track_iter(tree))
+
+
+def write_archive(tree):
+    writer = TarWriter(options.root, options.dest, options.keep_formats, options.outfile, options.errfile,
+                       options.extras)
+    writer.write_changes(tree, get_orphans())
+
+
+def run_commands(tree):
+    scheduler = CommandScheduler(options.root, options.dest, options.command, options.keep_formats,
+                                 options.command_workers, options.command_timeout, options.command_retries,
+                                 options.errfile, options.extras)
+    scheduler.write_changes(tree, get_orphans())
+
+
+def update_view(tree):
+    view = LinkView(options.dest, options.keep_formats, options.view, options.errfile, options.extras)
+    view.write_changes(tree, get_orphans())
+
+
+def execute_changes(tree):
+    journal = PlanFile.Journal(options.journal) if options.journal is not None else None
+    executor = NativeExecutor(options.root, options.dest, options.keep_formats, options.operation,
+                              options.io_workers, options.errfile, options.extras, journal)
+
+    try:
+        executor.write_changes(tree, get_orphans())
+    finally:
+        if journal is not None:
+            journal.close()
+
+
+def get_orphans():
+    return options.sync.orphans if options.sync else ()
 
 
 def parse_args(argv):
@@ -52,6 +320,41 @@ def parse_args(argv):
     def write_mode():
         options.run_op = write_changes
 
+    def manifest_mode():
+        options.run_op = write_manifest
+
+    def archive_mode():
+        options.run_op = write_archive
+
+    def schedule_mode(workers):
+        options.command_workers = int(workers)
+        options.run_op = run_commands
+
+    def set_command_timeout(seconds):
+        options.command_timeout = float(seconds)
+
+    def set_command_retries(retries):
+        options.command_retries = int(retries)
+
+    def view_mode(kind):
+        if kind not in LinkView.kinds:
+            raise Exception('"{}" is not a recognized view kind, expected one of {}'.format(kind, LinkView.kinds))
+
+        options.view = kind
+        options.run_op = update_view
+
+    def set_shards(shards):
+        options.shards = int(shards)
+
+    def set_plan_out(filename):
+        options.plan_out = filename
+
+    def set_plan_in(filename):
+        options.plan_in = filename
+
+    def set_journal(filename):
+        options.journal = filename
+
     def set_outfile(filename):
         options.outfile = get_file(filename)
 
@@ -67,6 +370,79 @@ def parse_args(argv):
     def set_command(command):
         options.command = command
 
+    def execute_mode(operation):
+        if operation not in NativeExecutor.operations:
+            raise Exception('"{}" is not a recognized operation, expected one of {}'.format(
+                operation, NativeExecutor.operations
+            ))
+
+        options.operation = operation
+        options.run_op = execute_changes
+
+    def set_io_workers(workers):
+        options.io_workers = int(workers)
+
+    def dedup_mode(mode):
+        if mode not in Deduplicator.modes:
+            raise Exception('"{}" is not a recognized duplicate mode, expected one of {}'.format(
+                mode, Deduplicator.modes
+            ))
+
+        options.dedup = mode
+
+    def stream_mode():
+        options.stream = True
+
+    def sync_mode():
+        options.sync = True
+
+    def sync_hash_mode():
+        options.sync = True
+        options.sync_hash = True
+
+    def set_answers(filename):
+        options.answers = filename
+
+    def batch_mode():
+        options.interactive = False
+
+    def progress_mode():
+        options.progress = True
+
+    def set_stats_file(filename):
+        options.stats_file = filename
+
+    def watch_mode(settle_seconds):
+        options.watch = True
+        options.settle_seconds = float(settle_seconds)
+
+    def set_tag_io_workers(workers):
+        options.tag_io_workers = int(workers)
+
+    def set_readahead(files):
+        options.readahead = int(files)
+
+    def set_snapshot(filename):
+        options.snapshot = os.path.abspath(filename)
+
+    def full_rescan():
+        options.full_rescan = True
+
+    def set_locality(window):
+        options.locality = int(window)
+
+    def album_mode():
+        options.albums = True
+
+    def set_jobs(jobs):
+        options.jobs = int(jobs)
+
+    def set_tag_cache(filename):
+        options.tag_cache = os.path.abspath(filename)
+
+    def prune_cache():
+        options.prune_cache = True
+
     arg_logic = {
         'p': print_mode,
         's': write_mode,
@@ -74,7 +450,37 @@ def parse_args(argv):
         'e': set_errfile,
         'd': set_destination,
         'f': set_format,
-        'c': set_command
+        'c': set_command,
+        'j': set_jobs,
+        't': set_tag_cache,
+        'T': prune_cache,
+        'x': execute_mode,
+        'i': set_io_workers,
+        'u': sync_mode,
+        'H': sync_hash_mode,
+        'a': set_answers,
+        'b': batch_mode,
+        'P': progress_mode,
+        'S': set_stats_file,
+        'W': watch_mode,
+        'D': dedup_mode,
+        'm': stream_mode,
+        'M': manifest_mode,
+        'n': set_shards,
+        'w': set_plan_out,
+        'r': set_plan_in,
+        'J': set_journal,
+        'I': set_tag_io_workers,
+        'Q': set_readahead,
+        'L': set_locality,
+        'N': set_snapshot,
+        'R': full_rescan,
+        'A': album_mode,
+        'X': archive_mode,
+        'v': view_mode,
+        'k': schedule_mode,
+        'O': set_command_timeout,
+        'Y': set_command_retries
     }
 
     i = 1
@@ -118,6 +524,6 @@ def get_file(filename):
         return open(filename, 'wb')
 
 
-run_op = write_changes
+options.run_op = write_changes
 
 main(sys.argv)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ID3Formatter
+from RuntimeOptions import RuntimeOptions
+
+
+def sample_tags(album, track):
+    tags = {
+        'year': '2001', 'date': '2001-05-04', 'originalyear': '2001', 'originaldate': '2001-05-04',
+        'label': 'Label {}'.format(album % 3) if album % 2 == 0 else None, 'catalogno': 'CAT-{}'.format(album),
+        'upc': None, 'media': 'CD', 'albumartist': 'Artist {}'.format(album // 10),
+        'album': 'Album {}'.format(album), 'genre': 'Rock', 'disctotal': '1', 'discnumber': '1',
+        'artist': 'Artist {}'.format(album // 10), 'tracktotal': '12', 'tracknumber': str(track).zfill(2),
+        'title': 'Track {}'.format(track), 'format': 'mp3'
+    }
+    tags.update({key.upper(): value.upper() if value is not None else None for key, value in tags.items()})
+
+    return tags
+
+
+def legacy_format_path(string_format, tags, filename):
+    return ID3Formatter.format_string(
+        string_format, {key: ID3Formatter._clean(value) for key, value in tags.items()}, filename
+    )
+
+
+def main(argv):
+    path_format = '/'.join(RuntimeOptions().path_format)
+    tracks = [sample_tags(album, track) for album in range(100) for track in range(1, 13)]
+    repeat = int(argv[1]) if len(argv) > 1 else 5
+
+    for tags in tracks:
+        if legacy_format_path(path_format, tags, '') != ID3Formatter.format_path(path_format, tags, ''):
+            raise Exception('Compiled format differs for {}'.format(tags))
+
+    for name, function in (('legacy', legacy_format_path), ('compiled', ID3Formatter.format_path)):
+        elapsed = min(timeit.repeat(
+            lambda: [function(path_format, tags, '') for tags in tracks], number=1, repeat=repeat
+        ))
+        print('{:>8}: {:8.2f} us/track'.format(name, elapsed / len(tracks) * 1e6))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import ID3
+import ID3Formatter
+import synthetic_library
+from BashWriter import BashWriter
+from FileScanner import FileScanner
+from FileTree import FileTree
+from ID3Tree import ID3Tree
+from RuntimeOptions import RuntimeOptions
+from TagResolver import TagResolver
+
+_answers = {'defaults': {'year': '0000', 'tracktotal': '00', 'disctotal': '1'}}
+
+
+def _no_prompt(tags, tag, filename):
+    return ''
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+
+    return time.perf_counter() - start, result
+
+
+def run(root, shape, options):
+    path_format = '/'.join(options.path_format)
+    stages = {}
+
+    stages['file_tree'], file_tree = timed(lambda: FileTree(root, add_children=True))
+    stages['scan'], filenames = timed(lambda: list(FileScanner(root, ID3.audio_extensions)))
+    del file_tree
+
+    def read_all():
+        return [(filename, ID3.complete_tags(tags, filename, _no_prompt)) for filename, tags in ID3.tag_iter(filenames)]
+
+    stages['get_tags'], tagged = timed(read_all)
+
+    def format_all():
+        return [ID3Formatter.format_path(path_format, tags, filename, _no_prompt) for filename, tags in tagged]
+
+    ID3Formatter.compile_format(path_format)
+    stages['format_path'], _ = timed(format_all)
+
+    def build_tree():
+        resolver = TagResolver(_answers, interactive=False, errfile=open(os.devnull, 'w'))
+        return ID3Tree(options.dest, path_format, filenames, resolver=resolver)
+
+    stages['id3_tree'], id3_tree = timed(build_tree)
+
+    with tempfile.NamedTemporaryFile('w', suffix='.sh') as outfile:
+        writer = BashWriter(root, options.dest, options.command, options.keep_formats, outfile, sys.stderr)
+        stages['write_changes'], _ = timed(lambda: writer.write_changes(id3_tree))
+
+    tracks = len(filenames)
+
+    return {
+        'shape': shape.name(),
+        'tracks': tracks,
+        'seconds': stages,
+        'us_per_track': {stage: seconds / max(tracks, 1) * 1e6 for stage, seconds in stages.items()},
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Time each stage of the organizer on synthetic libraries.')
+    parser.add_argument('--sizes', default='1000,10000,100000', help='comma separated track counts')
+    parser.add_argument('--discs', type=int, default=1)
+    parser.add_argument('--tracks', type=int, default=10, help='tracks per disc')
+    parser.add_argument('--albums', type=int, default=10, help='albums per artist')
+    parser.add_argument('--missing', type=float, default=0.0, help='probability of dropping optional tags')
+    parser.add_argument('--art-bytes', type=int, default=0, help='size of embedded and loose cover art')
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'music-organizer-bench'),
+                        help='where synthetic libraries are generated and reused')
+    parser.add_argument('--output', default='bench_output.json')
+    args = parser.parse_args(argv[1:])
+
+    options = RuntimeOptions()
+    options.dest = os.path.join(args.workdir, 'output')
+    results = []
+
+    for size in [int(size) for size in args.sizes.split(',')]:
+        shape = synthetic_library.Shape.for_size(
+            size, discs=args.discs, tracks=args.tracks, albums=args.albums, missing=args.missing,
+            art_bytes=args.art_bytes
+        )
+        root = os.path.join(args.workdir, shape.name())
+
+        if not os.path.isdir(root):
+            print('Generating {} tracks in {}'.format(shape.size(), root))
+            synthetic_library.generate(root, shape)
+
+        result = run(root, shape, options)
+        results.append(result)
+
+        print('{} tracks:'.format(result['tracks']))
+        for stage, seconds in result['seconds'].items():
+            print('    {:>14}: {:9.3f}s {:9.1f} us/track'.format(stage, seconds, result['us_per_track'][stage]))
+
+    with open(args.output, 'w') as output:
+        json.dump({
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': results,
+        }, output, indent=2)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import gc
+import os
+import re
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ID3
+from ID3Tree import ID3Tree
+from Tree import _key
+
+
+class LegacyNode:
+    def __init__(self, value, parent=None):
+        self.value = value
+        self.parent = parent
+        self._children = {}
+        self._path = None
+
+    def add_child_tree(self, children):
+        node = self
+
+        for value in children:
+            key = _key(value)
+            child = node._children.get(key)
+
+            if child is None:
+                child = node._children[key] = LegacyNode(value, node)
+
+            node = child
+
+
+def sample_track(album, track):
+    tags = {
+        'year': '2001', 'date': '2001-05-04', 'originalyear': '2001', 'originaldate': '2001-05-04',
+        'label': 'Label {}'.format(album % 3), 'catalogno': 'CAT-{}'.format(album), 'upc': None, 'media': 'CD',
+        'albumartist': 'Artist {}'.format(album // 10), 'album': 'Album {}'.format(album), 'genre': 'Rock',
+        'disctotal': '1', 'discnumber': '1', 'artist': 'Artist {}'.format(album // 10), 'tracktotal': '12',
+        'tracknumber': str(track), 'title': 'Track number {} of a reasonably long title'.format(track),
+        'format': 'flac'
+    }
+    filename = '/library/incoming/Artist {}/Album {} (2001)/{:02d} - Track number {}.flac'.format(
+        album // 10, album, track, track
+    )
+    path = 'Artist {}/2001 - Album {} [FLAC] {{Label {} CAT-{}}}/{:02d} Track number {}.flac'.format(
+        album // 10, album, album % 3, album, track, track
+    )
+
+    return filename, path, tags
+
+
+def legacy_build(tracks):
+    tree = LegacyNode('/music')
+
+    for filename, path, tags in tracks:
+        child_tree = re.sub('//+', '/', path).split('/')
+        child_tree[-1] = {
+            'name': child_tree[-1],
+            'src': filename,
+            'dst': '{}/{}'.format('/music', '/'.join(child_tree))
+        }
+        tree.add_child_tree(child_tree)
+
+    return tree
+
+
+def compact_build(tracks):
+    tree = ID3Tree('/music', '', [])
+
+    for filename, path, tags in tracks:
+        tree.add_track(filename, path)
+
+    return tree
+
+
+def legacy_tags(tracks):
+    held = []
+
+    for filename, path, tags in tracks:
+        tags = dict(tags)
+        tags.update({key.upper(): value.upper() if value is not None else None for key, value in tags.items()})
+        held.append(tags)
+
+    return held
+
+
+def compact_tags(tracks):
+    return [ID3.Tags(tags) for filename, path, tags in tracks]
+
+
+def measure(build, count):
+    tracks = [sample_track(index // 12, index % 12 + 1) for index in range(count)]
+    tracks = [(_copy(filename), _copy(path), dict(tags)) for filename, path, tags in tracks]
+
+    gc.collect()
+    tracemalloc.start()
+    result = build(tracks)
+    built_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    del result
+    return built_bytes / count
+
+
+def _copy(string):
+    return ''.join(list(string))
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 100000
+
+    print('Tree only:')
+    for name, build in (('legacy', legacy_build), ('compact', compact_build)):
+        print('{:>8}: {:8.0f} bytes/track ({} tracks)'.format(name, measure(build, count), count))
+
+    print('Tag dicts, if they were all kept alive:')
+    for name, build in (('legacy', legacy_tags), ('compact', compact_tags)):
+        print('{:>8}: {:8.0f} bytes/track ({} tracks)'.format(name, measure(build, count), count))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
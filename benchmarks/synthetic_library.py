@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import random
+import struct
+import sys
+
+from mutagen.flac import FLAC, Picture
+from mutagen.id3 import ID3, APIC, TALB, TCON, TDRC, TIT2, TPE1, TPE2, TPOS, TPUB, TRCK, TXXX
+from mutagen.ogg import OggPage
+from mutagen.oggvorbis import OggVorbis
+
+formats = ('mp3', 'flac', 'ogg')
+
+_mp3_frame = b'\xff\xfb\x90\x00' + b'\x00' * 413
+
+_flac_streaminfo = (
+    struct.pack('>HH', 4096, 4096) + b'\x00' * 6 + bytes((0x0a, 0xc4, 0x42, 0xf0)) + b'\x00' * 20
+)
+
+_vorbis_identification = (
+    b'\x01vorbis' + struct.pack('<IBIiii', 0, 2, 44100, 0, 128000, 0) + b'\xb8\x01'
+)
+
+
+class Shape:
+    def __init__(self, artists=10, albums=10, discs=1, tracks=10, missing=0.0, art_bytes=0, seed=0):
+        self.artists = artists
+        self.albums = albums
+        self.discs = discs
+        self.tracks = tracks
+        self.missing = missing
+        self.art_bytes = art_bytes
+        self.seed = seed
+
+    @classmethod
+    def for_size(cls, size, **kwargs):
+        discs = kwargs.pop('discs', 1)
+        tracks = kwargs.pop('tracks', 10)
+        albums = kwargs.pop('albums', 10)
+        artists = max(1, size // (albums * discs * tracks))
+
+        return cls(artists, albums, discs, tracks, **kwargs)
+
+    def size(self):
+        return self.artists * self.albums * self.discs * self.tracks
+
+    def name(self):
+        return '{}x{}x{}x{}-m{}-a{}-s{}'.format(
+            self.artists, self.albums, self.discs, self.tracks, self.missing, self.art_bytes, self.seed
+        )
+
+
+def generate(root, shape):
+    random.seed(shape.seed)
+    art = os.urandom(shape.art_bytes) if shape.art_bytes > 0 else None
+
+    for artist in range(shape.artists):
+        for album in range(shape.albums):
+            file_format = formats[(artist * shape.albums + album) % len(formats)]
+            directory = os.path.join(root, 'Artist {}'.format(artist), 'Album {}'.format(album))
+            os.makedirs(directory, exist_ok=True)
+
+            if art is not None:
+                with open(os.path.join(directory, 'cover.jpg'), 'wb') as cover:
+                    cover.write(art)
+
+            for disc in range(1, shape.discs + 1):
+                for track in range(1, shape.tracks + 1):
+                    tags = {
+                        'artist': 'Artist {}'.format(artist),
+                        'albumartist': 'Artist {}'.format(artist),
+                        'album': 'Album {}'.format(album),
+                        'title': 'Track {}'.format(track),
+                        'tracknumber': '{}/{}'.format(track, shape.tracks),
+                        'discnumber': '{}/{}'.format(disc, shape.discs),
+                        'date': '{}-01-01'.format(1960 + (artist + album) % 60),
+                        'genre': 'Genre {}'.format(artist % 7),
+                        'organization': 'Label {}'.format(album % 5),
+                        'catalognumber': 'CAT-{:04d}'.format(album),
+                    }
+
+                    for tag in ('date', 'organization', 'catalognumber'):
+                        if random.random() < shape.missing:
+                            del tags[tag]
+
+                    filename = os.path.join(directory, '{}-{:02d}.{}'.format(disc, track, file_format))
+                    _writers[file_format](filename, tags, art)
+
+
+def _write_mp3(filename, tags, art):
+    with open(filename, 'wb') as file:
+        file.write(_mp3_frame)
+
+    id3 = ID3()
+    frames = {
+        'title': TIT2, 'artist': TPE1, 'albumartist': TPE2, 'album': TALB, 'tracknumber': TRCK,
+        'discnumber': TPOS, 'date': TDRC, 'genre': TCON, 'organization': TPUB
+    }
+
+    for tag, value in tags.items():
+        if tag in frames:
+            id3.add(frames[tag](encoding=3, text=value))
+
+    if 'catalognumber' in tags:
+        id3.add(TXXX(encoding=3, desc='CATALOGNUMBER', text=tags['catalognumber']))
+
+    if art is not None:
+        id3.add(APIC(encoding=3, mime='image/jpeg', type=3, desc='Cover', data=art))
+
+    id3.save(filename)
+
+
+def _write_flac(filename, tags, art):
+    with open(filename, 'wb') as file:
+        file.write(b'fLaC' + bytes((0x80,)) + len(_flac_streaminfo).to_bytes(3, 'big') + _flac_streaminfo)
+
+    flac = FLAC(filename)
+    _set_vorbis_tags(flac, tags)
+
+    if art is not None:
+        picture = Picture()
+        picture.type = 3
+        picture.mime = 'image/jpeg'
+        picture.data = art
+        flac.add_picture(picture)
+
+    flac.save()
+
+
+def _write_ogg(filename, tags, art):
+    packets = (_vorbis_identification, b'\x03vorbis' + struct.pack('<II', 0, 0) + b'\x01', b'\x05vorbis\x00')
+
+    with open(filename, 'wb') as file:
+        for sequence, packet in enumerate(packets):
+            page = OggPage()
+            page.serial = 1
+            page.sequence = sequence
+            page.first = sequence == 0
+            page.last = sequence == len(packets) - 1
+            page.position = 0
+            page.packets = [packet]
+            file.write(page.write())
+
+    ogg = OggVorbis(filename)
+    _set_vorbis_tags(ogg, tags)
+    ogg.save()
+
+
+def _set_vorbis_tags(audio, tags):
+    for tag, value in tags.items():
+        audio['label' if tag == 'organization' else tag] = value
+
+
+_writers = {
+    'mp3': _write_mp3,
+    'flac': _write_flac,
+    'ogg': _write_ogg,
+}
+
+
+def main(argv):
+    if len(argv) < 3:
+        print('Usage: {} <root> <tracks> [missing ratio] [art bytes]'.format(argv[0]))
+        return
+
+    shape = Shape.for_size(
+        int(argv[2]), missing=float(argv[3]) if len(argv) > 3 else 0.0, art_bytes=int(argv[4]) if len(argv) > 4 else 0
+    )
+    generate(argv[1], shape)
+    print('Generated {} tracks ({}) in {}'.format(shape.size(), shape.name(), argv[1]))
+
+
+if __name__ == '__main__':
+    main(sys.argv)